@@ -1,10 +1,12 @@
 from .algorithms.mimosa_nacorr import na_correction_mimosa
-from .algorithms.matrix_nacorr import na_correction
+from .algorithms.matrix_nacorr import na_correction, na_correction_wide
 from .algorithms.mimosa_bgcorr import met_background_correction
 from .helpers import read_file, json_to_df, filter_df, merge_multiple_dfs, get_na_value_dict, parse_polyatom, \
-    get_global_isotope_dict
+    get_global_isotope_dict, get_na_value_table, read_parquet, read_feather, read_csv_typed
 from .inputs.maven_parser import maven_merge_dfs, convert_inputdata_to_stdfrom, convert_std_label_key_to_maven_label
-from .inputs.maven_parser import read_maven_file
+from .inputs.maven_parser import read_maven_file, get_wide_df, read_maven_file_by_metabolite
 from .inputs.multiquant_parser import merge_mq_metadata, mq_df_to_fragmentdict, get_validated_df_and_logs
+from .inputs.multiquant_parser import read_multiquant_dir
 from .output import convert_to_df, save_to_csv, convert_to_df_nacorr, convert_to_df_nacorr_MSMS
+from .output import save_to_parquet, save_to_feather, ResultWriter
 from .postprocess import replace_negatives, fractional_enrichment
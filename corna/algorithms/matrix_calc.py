@@ -3,10 +3,9 @@ import numpy as np
 from numpy.linalg import pinv
 import pandas as pd
 
-from corna.constants import ISOTOPE_NA_MASS, KEY_ELE
 from corna.inputs.maven_parser import frag_key
 from corna.helpers import get_isotope_element
-from corna.data_model import standard_model
+from corna.data_model import standard_model, standard_model_wide
 from corna.isotopomer import bulk_insert_data_to_fragment, Infopacket
 
 def make_expected_na_matrix(N, pvec):
@@ -15,7 +14,7 @@ def make_expected_na_matrix(N, pvec):
     and y is the expected distribution of intensities with natural abundance
 
     N: number of atoms of this element
-    pvec: expected isotopic distribution (e.g. [0.99,0.01])"""
+    pvec: expected isotopic distribution (e.g. [0.99,0.01]), list or numpy array"""
 
     max_label=1+(N*(len(pvec)-1))
     correction_matrix = np.zeros((max_label,N+1))
@@ -51,27 +50,59 @@ def make_correction_matrix(trac_atom, formuladict, na_dict, indist_elems):
     atom_bag: dict of element:number of atoms in molecule (e.g. {'C':2,'O':1,'H':6})
     label_elem: element with input labeling
     indist_elems: elements with identical mass shift
-    na_dict: dict of element:expected isotopic distribution
+    na_dict: dict of element:expected isotopic distribution, lists or numpy arrays
+             (e.g. the NATable of helpers.get_na_value_table)
     :TODO This function relates to issue NCT-247. Need to change the function
     in more appropriate way.
     """
     M = make_expected_na_matrix(formuladict.get(trac_atom, 0), na_dict[trac_atom])
     for e in indist_elems:
         if e in formuladict:
-            e1 = ISOTOPE_NA_MASS[KEY_ELE][e]
+            e1 = get_isotope_element(e)
             M = add_indistinguishable_element(M, formuladict[e1], na_dict[e])
     return pinv(M)
 
 
-def make_all_corr_matrices(isotracers, formula_dict, na_dict, eleme_corr):
+def get_correction_matrix_key(trac_atom, formuladict, na_dict, indist_elems):
+    """key of the inputs which decide the matrix made by make_correction_matrix:
+    number of tracer atoms, natural abundance of the tracer and number of atoms and
+    natural abundance of each indistinguishable element in the formula. Metabolites
+    with the same key have the same correction matrix."""
+    indist_key = tuple((e, formuladict[get_isotope_element(e)], tuple(na_dict[e]))
+                       for e in indist_elems if e in formuladict)
+    return trac_atom, formuladict.get(trac_atom, 0), tuple(na_dict[trac_atom]), indist_key
+
+
+def get_indist_list(trac_atom, eleme_corr):
+    try:
+        return eleme_corr[trac_atom]
+    except KeyError:
+        return []
+
+
+def make_all_corr_matrices(isotracers, formula_dict, na_dict, eleme_corr, matrix_cache=None,
+                           matrix_keys=None):
+    """creates correction matrix of each isotracer. If matrix_cache dictionary is given,
+    matrices are looked up in it by get_correction_matrix_key and new matrices are
+    added to it, so metabolites with same key share one matrix. If matrix_keys
+    dictionary is given, the key of the matrix of each isotracer is recorded in it.
+    na_dict is used as it is, callers correcting many metabolites convert it to an
+    NATable once (see matrix_nacorr.nacorr_metabolite_dict)."""
     corr_mats = {}
     for isotracer in isotracers:
         trac_atom = get_isotope_element(isotracer)
-        try:
-            indist_list = eleme_corr[trac_atom]
-        except KeyError:
-            indist_list = []
-        corr_mats[isotracer] = make_correction_matrix(trac_atom, formula_dict, na_dict, indist_list)
+        indist_list = get_indist_list(trac_atom, eleme_corr)
+        matrix_key = None
+        if matrix_cache is not None or matrix_keys is not None:
+            matrix_key = get_correction_matrix_key(trac_atom, formula_dict, na_dict, indist_list)
+        if matrix_keys is not None:
+            matrix_keys[isotracer] = matrix_key
+        if matrix_cache is not None and matrix_key in matrix_cache:
+            corr_mats[isotracer] = matrix_cache[matrix_key]
+        else:
+            corr_mats[isotracer] = make_correction_matrix(trac_atom, formula_dict, na_dict, indist_list)
+            if matrix_cache is not None:
+                matrix_cache[matrix_key] = corr_mats[isotracer]
     return corr_mats
 
 def fragmentsdict_model(merged_df, intensity_col):
@@ -83,9 +114,29 @@ def fragmentsdict_model(merged_df, intensity_col):
         fragments_dict : Dictionary of the form, example : {'Aceticacid_C13_1':
         [Fragment object, {'sample_1': array([ 0.0164])}, False, 'Aceticacid']
     """
-    fragments_dict = {}
     frag_merge_df = frag_key(merged_df)
     std_model_mvn = standard_model(frag_merge_df, intensity_col)
+    return std_model_to_fragments_dict(std_model_mvn)
+
+
+def fragmentsdict_model_wide(wide_df, sample_columns):
+    """
+    This function converts the dataframe in wide form (MAVEN layout, one column
+    per sample) into fragment dictionary model without melting it to long form
+    Args:
+        wide_df : dataframe with Name, Label, Formula and sample columns
+        sample_columns : sample columns holding the intensities
+    Returns:
+        fragments_dict : Dictionary of the form, example : {'Aceticacid_C13_1':
+        [Fragment object, {'sample_1': array([ 0.0164])}, False, 'Aceticacid']
+    """
+    frag_wide_df = frag_key(wide_df)
+    std_model_mvn = standard_model_wide(frag_wide_df, sample_columns)
+    return std_model_to_fragments_dict(std_model_mvn)
+
+
+def std_model_to_fragments_dict(std_model_mvn):
+    fragments_dict = {}
     for metabolite_name, label_dict in std_model_mvn.iteritems():
         fragments_dict[metabolite_name] = {}
         for label, data in label_dict.iteritems():
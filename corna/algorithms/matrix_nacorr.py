@@ -4,14 +4,19 @@ and performs na correction (na_correction function). The output is given in the
 dictionary model which can further be used in post processing function, converting to dataframr, etc
 """
 
+from collections import OrderedDict
+import logging
+
 import numpy as np
 import pandas as pd
 
 import corna.algorithms.matrix_calc as algo
-from corna.autodetect_isotopes import get_element_correction_dict
+from corna.autodetect_isotopes import get_element_correction_dicts, warn_borderline_ppm
 from corna.constants import INTENSITY_COL
-from corna.helpers import get_isotope_element, first_sub_second
-from corna.inputs.maven_parser import convert_labels_to_std
+from corna.helpers import get_isotope_element, first_sub_second, get_na_table
+from corna.inputs.maven_parser import convert_labels_to_std, get_sample_column
+
+logger = logging.getLogger(__name__)
 
 
 def eleme_corr_invalid_entry(iso_tracers, eleme_corr):
@@ -29,7 +34,7 @@ def eleme_corr_invalid_entry(iso_tracers, eleme_corr):
                                ') , invalid input in eleme_corr dictionary')
 
 
-def nacorr_each_metab(fragments_dict, iso_tracers, eleme_corr, na_dict):
+def nacorr_each_metab(fragments_dict, iso_tracers, eleme_corr, na_dict, corr_mats=None):
     """
     This function is wrapper around matrix_calc.py function. It performs na correction
     for single and multiple tracers and creates the output in the form of fragment
@@ -45,13 +50,17 @@ def nacorr_each_metab(fragments_dict, iso_tracers, eleme_corr, na_dict):
 
         na_dict : Dictionary of natural abundance values
 
+        corr_mats : correction matrix of each isotracer, made from the other
+                    arguments if not given (see plan_correction_matrices)
+
     Returns:
         nacorr_dict_model : fragments dictionary with corrected intensity values
     """
 
     lab_samp_df = algo.label_sample_df(iso_tracers, fragments_dict)
-    formula_dict = algo.formuladict(fragments_dict)
-    corr_mats = algo.make_all_corr_matrices(iso_tracers, formula_dict, na_dict, eleme_corr)
+    if corr_mats is None:
+        formula_dict = algo.formuladict(fragments_dict)
+        corr_mats = algo.make_all_corr_matrices(iso_tracers, formula_dict, na_dict, eleme_corr)
     df_corr_C_N = correct_label_sample_df(iso_tracers, lab_samp_df, corr_mats)
     nacorr_dict_model = algo.fragmentdict_model(
         iso_tracers, fragments_dict, df_corr_C_N)
@@ -125,17 +134,123 @@ def na_correction(merged_df, iso_tracers, ppm_input_user, na_dict, eleme_corr,
     """
     std_label_df = convert_labels_to_std(merged_df, iso_tracers)
     metabolite_dict = algo.fragmentsdict_model(std_label_df, intensity_col)
+    return nacorr_metabolite_dict(metabolite_dict, iso_tracers, ppm_input_user, na_dict,
+                                  eleme_corr, autodetect)
+
+
+def na_correction_wide(wide_df, iso_tracers, ppm_input_user, na_dict, eleme_corr,
+                       sample_columns=None, autodetect=False):
+    """
+    This function performs na correction on MAVEN data in wide form, i.e. one
+    row per metabolite and label and one column per sample, as returned by
+    maven_parser.get_wide_df. The data is not melted to long form.
+    Args:
+        wide_df: data frame with Name, Label, Formula and sample columns
+        iso_tracers: list of labeled elements. eg ['C13', 'N15']
+        ppm_input_user: ppm resolution of the machine, used with autodetect = True
+        na_dict: dictionary with natural abundance values of the elements.
+        eleme_corr: standard dict of indistinguishable elements for correction
+                    when autodetect=False. eg - {'C13':['H','O']}
+        sample_columns: sample columns to be corrected, by default all columns
+                        other than Name, Label and Formula
+        autodetect: It takes boolean value for auto detection. By default it is False.
+
+    Returns:
+        na_corr_dict: na corrected dict
+        eleme_corr_dict : dictionary od indistinguishable isotopes used for correction
+    """
+    if sample_columns is None:
+        sample_columns = get_sample_column(wide_df)
+    std_label_df = convert_labels_to_std(wide_df, iso_tracers)
+    metabolite_dict = algo.fragmentsdict_model_wide(std_label_df, sample_columns)
+    return nacorr_metabolite_dict(metabolite_dict, iso_tracers, ppm_input_user, na_dict,
+                                  eleme_corr, autodetect)
+
+
+def plan_correction_matrices(metabolite_dict, iso_tracers, na_dict, eleme_corr_dicts):
+    """
+    This function groups the metabolites by the inputs of their correction
+    matrices (see matrix_calc.get_correction_matrix_key), i.e. number of tracer
+    atoms, indistinguishable elements and natural abundance values, and makes
+    each correction matrix once for all the metabolites sharing it.
+    Args:
+        metabolite_dict: fragments dictionary model of all the metabolites
+        iso_tracers: list of labeled elements. eg ['C13', 'N15']
+        na_dict: dictionary with natural abundance values of the elements.
+        eleme_corr_dicts: indistinguishable elements of each metabolite
+
+    Returns:
+        metabolite_corr_mats: correction matrices of each metabolite
+        bucket_sizes: list of number of metabolites sharing the same
+                      correction matrices, largest first
+    """
+    matrix_cache = {}
+    metabolite_corr_mats = {}
+    buckets = OrderedDict()
+    for metabolite, fragments_dict in metabolite_dict.iteritems():
+        matrix_keys = {}
+        metabolite_corr_mats[metabolite] = algo.make_all_corr_matrices(
+            iso_tracers, algo.formuladict(fragments_dict), na_dict,
+            eleme_corr_dicts[metabolite], matrix_cache, matrix_keys)
+        bucket_key = tuple(matrix_keys[isotracer] for isotracer in iso_tracers)
+        buckets[bucket_key] = buckets.get(bucket_key, 0) + 1
+
+    return metabolite_corr_mats, sorted(buckets.values(), reverse=True)
+
+
+def get_matrix_sharing_report(bucket_sizes):
+    """
+    This function returns the message reporting how many metabolites share
+    each set of correction matrices (see plan_correction_matrices).
+    """
+    return '{} metabolites share {} sets of correction matrices, metabolites ' \
+           'per set: {}'.format(sum(bucket_sizes), len(bucket_sizes), bucket_sizes)
+
+
+def get_eleme_corr_dicts(metabolite_dict, iso_tracers, ppm_input_user, eleme_corr,
+                         autodetect=False):
+    """
+    This function resolves the indistinguishable elements of every metabolite.
+    With autodetect they are detected for all the formulas together and borderline
+    ppm requirements are reported in a single warning, else eleme_corr is used
+    for all the metabolites.
+    """
+    if not autodetect:
+        eleme_corr_invalid_entry(iso_tracers, eleme_corr)
+        return {metabolite: eleme_corr for metabolite in metabolite_dict}
+
+    formulas = [metabolite.formula for metabolite in metabolite_dict]
+    auto_eleme_corr_dicts, borderline_report = get_element_correction_dicts(
+        ppm_input_user, formulas, iso_tracers)
+    warn_borderline_ppm(borderline_report)
+    return {metabolite: {key: list(value) for key, value
+                         in auto_eleme_corr_dicts[metabolite.formula].iteritems()}
+            for metabolite in metabolite_dict}
+
+
+def nacorr_metabolite_dict(metabolite_dict, iso_tracers, ppm_input_user, na_dict, eleme_corr,
+                           autodetect=False):
+    """
+    This function performs na correction for every metabolite of the fragments
+    dictionary model and returns the corrected dictionary with the
+    indistinguishable isotopes used for each metabolite. Indistinguishable
+    isotopes of all the metabolites are resolved first, so that metabolites
+    with same correction matrices share them (see plan_correction_matrices),
+    the number of metabolites sharing each set of matrices is logged at debug
+    level. na_dict is converted to an NATable once for all the metabolites.
+    """
+    na_dict = get_na_table(na_dict)
+    eleme_corr_dicts = get_eleme_corr_dicts(metabolite_dict, iso_tracers, ppm_input_user,
+                                            eleme_corr, autodetect)
+    metabolite_corr_mats, bucket_sizes = plan_correction_matrices(metabolite_dict, iso_tracers,
+                                                                  na_dict, eleme_corr_dicts)
+    logger.debug(get_matrix_sharing_report(bucket_sizes))
     na_corr_dict = {}
     eleme_corr_dict = {}
-    if autodetect:
-        for metabolite, fragments_dict in metabolite_dict.iteritems():
-            auto_eleme_corr = get_element_correction_dict(ppm_input_user, metabolite.formula,iso_tracers)
-            na_corr_dict[metabolite] = nacorr_each_metab(fragments_dict, iso_tracers, auto_eleme_corr, na_dict)
-            eleme_corr_dict[metabolite.name] = auto_eleme_corr
-    else:
-        eleme_corr_invalid_entry(iso_tracers, eleme_corr)
-        for metabolite, fragments_dict in metabolite_dict.iteritems():
-            na_corr_dict[metabolite] = nacorr_each_metab(fragments_dict, iso_tracers, eleme_corr, na_dict)
-            eleme_corr_dict[metabolite.name] = eleme_corr
+    for metabolite, fragments_dict in metabolite_dict.iteritems():
+        na_corr_dict[metabolite] = nacorr_each_metab(fragments_dict, iso_tracers,
+                                                     eleme_corr_dicts[metabolite], na_dict,
+                                                     metabolite_corr_mats[metabolite])
+        eleme_corr_dict[metabolite.name] = eleme_corr_dicts[metabolite]
 
-    return na_corr_dict, eleme_corr_dict
\ No newline at end of file
+    return na_corr_dict, eleme_corr_dict
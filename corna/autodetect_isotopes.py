@@ -1,7 +1,16 @@
+import warnings
+
+import numpy as np
+
 import constants as cs
 import helpers as hl
 from model import Ion
 
+AUTODETECT_CACHE = {}
+AUTODETECT_CACHE_SIZE = 32
+CANDIDATE_ISOTOPES = sorted(set(isotope for mass_diff_dict in cs.MASS_DIFF_DICT.values()
+                                for isotope in mass_diff_dict))
+
 
 def get_ppm_required(formula, delta_m):
     """This function calculates the ppm required to
@@ -143,32 +152,150 @@ def add_isotopes_list(indis_ele_list):
     return indis_ele_list_isotopes
 
 
-def get_element_correction_dict(ppm_user_input, formula, isotracer):
-    """This function returns a dictionary with all isotracer elements
-    as key and indistinguishable isotopes as values.
+def get_candidate_isotopes(formula, isotracer):
+    """This function returns the isotopes to be tested as indistinguishable
+    for each isotracer whose element is in the formula, in the order in
+    which they are reported in the element correction dictionary.
 
     Args:
-        ppm_user_input: ppm of the machine used.
         formula: formula of the metabolite
-        isotracer: labelled element which is to be corrected
+        isotracer: list of labelled elements
 
     Returns:
-        element_correction_dict: element correction dictionary.
+        list of tuples of isotracer and list of candidate isotopes
     """
-
-    element_correction_dict = {}
     ion_object = Ion('', formula)
     ele_list = (ion_object.get_formula()).keys()
     isotracer_list = get_isotope_element_list(isotracer)
     isotope_ele = get_isotope_element_list(cs.MASS_DIFF_DICT.keys())
     ele_list_without_isotracer = set(ele_list) - set(isotracer_list)
+    candidates = []
     for isotope in isotracer:
         if isotope[0] in ele_list:
             indis_ele_list = list(ele_list_without_isotracer.intersection(set(isotope_ele)))
-            indis_ele_list = add_isotopes_list(indis_ele_list)
-            get_ele = lambda iso: get_indistinguishable_ele(isotope, formula, ppm_user_input, iso)
-            indis_element = map(get_ele, indis_ele_list)
-            indis_element = filter(None, indis_element)
+            candidates.append((isotope, add_isotopes_list(indis_ele_list)))
+    return candidates
+
+
+def get_required_ppm_matrix(formulas, isotracer):
+    """This function calculates the ppm required to distinguish each
+    isotracer from each candidate isotope (CANDIDATE_ISOTOPES) for all the
+    formulas at once. Pairs without mass difference are nan.
+
+    Args:
+        formulas: list of formulas
+        isotracer: list of labelled elements
+
+    Returns:
+        required_ppm: array of shape (formula x isotracer x candidate isotope)
+    """
+    mol_weights = np.array([hl.get_formula_mol_weight(formula) for formula in formulas],
+                           dtype=float)
+    mass_diffs = np.array([[cs.MASS_DIFF_DICT.get(isotope, {}).get(candidate, np.nan)
+                            for candidate in CANDIDATE_ISOTOPES] for isotope in isotracer],
+                          dtype=float).reshape(len(isotracer), len(CANDIDATE_ISOTOPES))
+    return 1000000 * (mass_diffs[np.newaxis, :, :] / mol_weights[:, np.newaxis, np.newaxis])
+
+
+def autodetect_formulas(ppm_user_input, formulas, isotracer):
+    """This function detects indistinguishable isotopes of the formulas
+    which are not in AUTODETECT_CACHE and caches the element correction
+    dictionary and borderline ppm report of each formula. The cache is
+    cleared when it is full, so the results are also returned as a
+    dictionary of formula and (element correction dict, borderline report).
+    """
+    isotracer = list(isotracer)
+    required_ppm = get_required_ppm_matrix(formulas, isotracer)
+    with np.errstate(invalid='ignore'):
+        is_borderline = ((required_ppm - cs.BORDERLINE_LIMIT) <= ppm_user_input) & \
+                        (ppm_user_input <= (required_ppm + cs.BORDERLINE_LIMIT))
+        is_indistinguishable = is_borderline | (ppm_user_input > required_ppm)
+
+    candidate_column = {candidate: column for column, candidate in enumerate(CANDIDATE_ISOTOPES)}
+    results = {}
+    for row, formula in enumerate(formulas):
+        element_correction_dict = {}
+        borderline_report = []
+        for isotope, candidates in get_candidate_isotopes(formula, isotracer):
+            tracer = isotracer.index(isotope)
+            indis_element = []
+            for candidate in candidates:
+                column = candidate_column.get(candidate)
+                if column is None:
+                    continue
+                if is_borderline[row, tracer, column]:
+                    borderline_report.append({'formula': formula, 'isotracer': isotope,
+                                              'element': candidate,
+                                              'required_ppm': required_ppm[row, tracer, column]})
+                if is_indistinguishable[row, tracer, column]:
+                    indis_element.append(candidate)
             element_correction_dict[isotope[0]] = indis_element
+        results[formula] = (element_correction_dict, borderline_report)
+        if len(AUTODETECT_CACHE) >= AUTODETECT_CACHE_SIZE:
+            AUTODETECT_CACHE.clear()
+        AUTODETECT_CACHE[(formula, tuple(isotracer), ppm_user_input)] = results[formula]
+
+    return results
+
 
-    return element_correction_dict
+def get_element_correction_dicts(ppm_user_input, formulas, isotracer):
+    """This function returns element correction dictionaries of all the
+    formulas. Required ppm of the formulas not seen before is computed in a
+    single pass (see get_required_ppm_matrix) and results are cached by
+    formula, isotracers and ppm.
+
+    Args:
+        ppm_user_input: ppm of the machine used.
+        formulas: list of formulas of the metabolites
+        isotracer: labelled elements which are to be corrected
+
+    Returns:
+        element_correction_dicts: dictionary of formula and its element correction dictionary
+        borderline_report: list of dictionaries of formula, isotracer, element and
+                           required ppm for which the ppm requirement is at the borderline
+    """
+    unique_formulas = list(set(formulas))
+    results = {}
+    for formula in unique_formulas:
+        cache_key = (formula, tuple(isotracer), ppm_user_input)
+        if cache_key in AUTODETECT_CACHE:
+            results[formula] = AUTODETECT_CACHE[cache_key]
+    new_formulas = [formula for formula in unique_formulas if formula not in results]
+    if new_formulas:
+        results.update(autodetect_formulas(ppm_user_input, new_formulas, isotracer))
+
+    element_correction_dicts = {}
+    borderline_report = []
+    for formula in unique_formulas:
+        element_correction_dict, formula_report = results[formula]
+        element_correction_dicts[formula] = {key: list(value) for key, value
+                                             in element_correction_dict.iteritems()}
+        borderline_report.extend(formula_report)
+
+    return element_correction_dicts, borderline_report
+
+
+def warn_borderline_ppm(borderline_report):
+    """This function raises a single warning for all the formulas and elements
+    whose ppm requirement is at the borderline."""
+    if borderline_report:
+        warnings.warn(cs.PPM_REQUIREMENT_VALIDATION + ', '.join(
+            '{}:{}'.format(entry['formula'], entry['element']) for entry in borderline_report))
+
+
+def get_element_correction_dict(ppm_user_input, formula, isotracer):
+    """This function returns a dictionary with all isotracer elements
+    as key and indistinguishable isotopes as values.
+
+    Args:
+        ppm_user_input: ppm of the machine used.
+        formula: formula of the metabolite
+        isotracer: labelled element which is to be corrected
+
+    Returns:
+        element_correction_dict: element correction dictionary.
+    """
+    element_correction_dicts, borderline_report = get_element_correction_dicts(
+        ppm_user_input, [formula], isotracer)
+    warn_borderline_ppm(borderline_report)
+    return element_correction_dicts[formula]
@@ -0,0 +1,191 @@
+"""
+This file caches dataframes parsed from input files which are slow to read,
+such as excel metadata files. Parsed dataframes are pickled in the cache
+directory and keyed by the path, size, modification time and content hash of
+the input file, so a changed file is read again.
+
+Validation results can also be cached (see read_validation_cached), they
+are keyed by the content hash of the input files and the validation settings,
+so revalidating an unchanged file is a cache hit even if it is uploaded to a
+new path.
+
+The cache is disabled by default, it is enabled by setting CORNA_CACHE_DIR
+environment variable to the cache directory.
+"""
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+
+CACHE_DIR_ENV = 'CORNA_CACHE_DIR'
+CACHE_EXTENSION = '.pkl'
+EXCEL_EXTENSION = ['.xls', '.xlsx']
+HASH_BLOCK_SIZE = 1 << 20
+VALIDATION_CACHE_PREFIX = 'validation_'
+VALIDATION_CACHE_VERSION = '1'
+
+
+def get_cache_dir():
+    """
+    This function returns the cache directory, None if CORNA_CACHE_DIR is
+    not set or empty, i.e. the cache is disabled.
+    """
+    return os.environ.get(CACHE_DIR_ENV) or None
+
+
+def get_file_hash(path):
+    """
+    This function returns md5 hash of the content of the file.
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(HASH_BLOCK_SIZE), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def get_cache_key(path):
+    """
+    This function returns the cache key of a file made from its path, size,
+    modification time and content hash.
+    """
+    file_stat = os.stat(path)
+    key = '|'.join([os.path.abspath(path), str(file_stat.st_size),
+                    repr(file_stat.st_mtime), get_file_hash(path)])
+    return hashlib.md5(key).hexdigest()
+
+
+def get_path_prefix(path):
+    """
+    This function returns prefix of the cache files of a path, it is used to
+    remove cache of older versions of the file.
+    """
+    return hashlib.md5(os.path.abspath(path)).hexdigest() + '_'
+
+
+def get_cache_path(cache_dir, path, cache_key):
+    return os.path.join(cache_dir, get_path_prefix(path) + cache_key + CACHE_EXTENSION)
+
+
+def write_pickle(obj, cache_dir, cache_path):
+    """
+    This function pickles obj to cache_path. The obj is written to a
+    temporary file and then renamed, so that a cache file is never read half
+    written. The temporary file is removed if pickling fails.
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            pickle.dump(obj, temp_file, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def read_pickle(cache_path):
+    with open(cache_path, 'rb') as cache_file:
+        return pickle.load(cache_file)
+
+
+def write_cache(df, cache_dir, path, cache_path):
+    """
+    This function pickles df to cache_path and removes the cache of older
+    versions of the same file. Failures are ignored as the cache is only an
+    optimisation.
+    """
+    try:
+        write_pickle(df, cache_dir, cache_path)
+        prefix = get_path_prefix(path)
+        for file_name in os.listdir(cache_dir):
+            old_cache_path = os.path.join(cache_dir, file_name)
+            if file_name.startswith(prefix) and old_cache_path != cache_path:
+                os.remove(old_cache_path)
+    except (IOError, OSError):
+        pass
+
+
+def read_cached(path, reader):
+    """
+    This function returns the dataframe of the file at path from the cache,
+    if it is not in the cache it is read with reader and cached.
+    Args:
+        path : path to input file
+        reader : function which takes path and returns a dataframe
+
+    Returns:
+        df : dataframe of the input file
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None or not os.path.isfile(path):
+        # reader raises its usual error for a missing file
+        return reader(path)
+
+    cache_path = get_cache_path(cache_dir, path, get_cache_key(path))
+    if os.path.isfile(cache_path):
+        try:
+            return read_pickle(cache_path)
+        except Exception:
+            pass
+
+    df = reader(path)
+    write_cache(df, cache_dir, path, cache_path)
+    return df
+
+
+def read_excel_cached(path, header=0):
+    """
+    This function reads an excel file with pd.read_excel using the cache.
+    """
+    return read_cached(path, lambda excel_path: pd.read_excel(excel_path, header=header))
+
+
+def is_excel_file(path):
+    return os.path.splitext(path)[1] in EXCEL_EXTENSION
+
+
+def get_content_key(paths, *key_parts):
+    """
+    This function returns the cache key made from the content hash of the
+    files in paths and key_parts, paths which are None or empty are skipped.
+    The path and modification time are not part of the key.
+    """
+    key = [VALIDATION_CACHE_VERSION]
+    key.extend(get_file_hash(path) if path else '' for path in paths)
+    key.extend(repr(key_part) for key_part in key_parts)
+    return hashlib.md5('|'.join(key)).hexdigest()
+
+
+def read_validation_cached(cache_key, validate):
+    """
+    This function returns the validation result of cache_key from the cache,
+    if it is not in the cache validate is called and its result is cached.
+    Args:
+        cache_key : key of the validation result (see get_content_key)
+        validate : function without arguments which returns the validation
+                   result, for ex. corrected df and logs
+
+    Returns:
+        result of validate
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return validate()
+
+    cache_path = os.path.join(cache_dir, VALIDATION_CACHE_PREFIX + cache_key + CACHE_EXTENSION)
+    if os.path.isfile(cache_path):
+        try:
+            return read_pickle(cache_path)
+        except Exception:
+            pass
+
+    result = validate()
+    try:
+        write_pickle(result, cache_dir, cache_path)
+    except (IOError, OSError):
+        pass
+    return result
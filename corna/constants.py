@@ -45,6 +45,7 @@ FORMULA_STATE_INVALID = 'formula not correct'
 COLUMN_STATE = 'state'
 COLUMN_ROW = 'row_number'
 COLUMN_NAME = 'column_name'
+COLUMN_DUPLICATE_OF = 'duplicate_of'
 COMPONENT_NAME = 'Component Name'
 NAME_COL = 'Name'
 NA_LCMS = 'na_lcms'
@@ -64,6 +65,12 @@ WARNING_STATE = [DUPLICATE_STATE,MISSING_STATE]
 VALIDATION_COLUMN_NAME = 'column'
 VALIDATION_MSG_ROW_DROPPED = "Row is Dropped"
 VALIDATION_MSG_FILL_NA = "Missing value of columns replaced with 0"
+VALIDATION_MODE_FULL = 'full'
+VALIDATION_MODE_SCHEMA = 'schema'
+VALIDATION_MODE_SAMPLED = 'sampled'
+VALIDATION_MODES = [VALIDATION_MODE_FULL, VALIDATION_MODE_SCHEMA, VALIDATION_MODE_SAMPLED]
+VALIDATION_SAMPLE_SIZE = 0.1
+VALIDATION_CHUNK_SIZE = 50000
 MOL_MASS_VALIDATE = 'Molecular weight of a metabolite cannot be zero'
 PPM_REQUIREMENT_VALIDATION = 'The ppm requirement is at the boderline for '
 MISSING_COMPONENTS = "missing_components"
@@ -101,6 +108,9 @@ INDIS_ISOTOPE_COL = 'Indistinguishale_isotope'
 POOL_TOTAL_COL = 'Pool_total'
 METABOLITE_NAME = 'metab_name'
 
+##Columns stored as dictionary encoded (categorical) in parquet/feather files
+CATEGORICAL_COLUMNS = [NAME_COL, FORMULA_COL, LABEL_COL, SAMPLE_COL]
+
 ##summary tab
 SUMMARY_LABEL = 'label'
 SUMMARY_VAL = 'value'
@@ -14,7 +14,7 @@ class FileExistError(Exception):
         self.message = arg
 
 class FileExtensionError(Exception):
-    def __init__(self, arg = 'Only CSV , TXT , XLS ,XLSX file extension are allowed.'):
+    def __init__(self, arg = 'Only CSV , TXT , XLS ,XLSX , PARQUET , FEATHER file extension are allowed.'):
         self.message = arg
 
 class FileEmptyError(Exception):
@@ -1,27 +1,54 @@
 import numpy as np
 
-from helpers import get_unique_values
 from constants import FRAG_COL, LABEL_COL, SAMPLE_COL
 
 
 def standard_model(df, intensity_col):
     """
-    This function convert the merged data into standard data model
+    This function convert the merged data into standard data model of the form
+    {fragment key: {label: {sample: intensity}}}. It is built in a single pass
+    over the rows, for a repeated (fragment, label, sample) the first intensity
+    is kept. Rows with missing label or sample are left out.
     """
+    first_rows = df.drop_duplicates([FRAG_COL, LABEL_COL, SAMPLE_COL])
+    first_rows = first_rows[first_rows[LABEL_COL].notnull() & first_rows[SAMPLE_COL].notnull()]
+    std_model_dict = {}
+
+    for frags, label, sample, intensity in zip(first_rows[FRAG_COL].tolist(),
+                                               first_rows[LABEL_COL].tolist(),
+                                               first_rows[SAMPLE_COL].tolist(),
+                                               first_rows[intensity_col].tolist()):
+        try:
+            lab_dict = std_model_dict[frags]
+        except KeyError:
+            lab_dict = std_model_dict[frags] = {}
+        try:
+            lab_dict[label][sample] = intensity
+        except KeyError:
+            lab_dict[label] = {sample: intensity}
+
+    return std_model_dict
 
-    unique_frags = get_unique_values(df, FRAG_COL)
+
+def standard_model_wide(df, sample_columns):
+    """
+    This function convert wide data (one row per fragment and label, one column
+    per sample) into the standard data model of standard_model. Intensities are
+    read from the sample columns as a single 2-D float block, for a repeated
+    (fragment, label) the first row is kept.
+    """
+    first_rows = df.drop_duplicates([FRAG_COL, LABEL_COL])
+    intensity_block = first_rows[sample_columns].values.astype(np.float64)
     std_model_dict = {}
 
-    for frags in unique_frags:
-        df_subset = df[df[FRAG_COL] == frags]
-        unq_labels = get_unique_values(df_subset, LABEL_COL)
-        lab_dict = {}
-        for label in unq_labels:
-            df_labels = df_subset[df_subset[LABEL_COL] == label]
-            label_frame = df_labels.groupby(SAMPLE_COL)[intensity_col].apply(_to_float)
-            label_dict = label_frame.to_dict()
-            lab_dict[label] = label_dict
-        std_model_dict[frags] = lab_dict
+    for frags, label, intensities in zip(first_rows[FRAG_COL].tolist(),
+                                         first_rows[LABEL_COL].tolist(),
+                                         intensity_block.tolist()):
+        try:
+            lab_dict = std_model_dict[frags]
+        except KeyError:
+            lab_dict = std_model_dict[frags] = {}
+        lab_dict[label] = dict(zip(sample_columns, intensities))
 
     return std_model_dict
 
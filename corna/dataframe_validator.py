@@ -2,13 +2,20 @@ import custom_exception
 import os
 import pandas as pd
 
+from cache import read_excel_cached
+from helpers import read_input_parquet, read_input_feather
+from helpers import read_csv_typed, TYPED_CSV_SEPARATOR
 from inputs.column_conventions import maven as c
 
 REQUIRED_COLUMNS_RAW_DATA = (c.NAME, c.LABEL, c.FORMULA)
-KNOWN_EXTENSION = {'.xls': pd.read_excel,
-                   '.xlsx': pd.read_excel,
+KNOWN_EXTENSION = {'.xls': read_excel_cached,
+                   '.xlsx': read_excel_cached,
                    '.csv': pd.read_csv,
-                   '.txt': pd.read_table}
+                   '.txt': pd.read_table,
+                   '.parquet': read_input_parquet,
+                   '.feather': read_input_feather,
+                   '.arrow': read_input_feather}
+COLUMNAR_EXTENSION = ['.parquet', '.feather', '.arrow']
 
 
 def check_if_file_exist(path):
@@ -44,7 +51,7 @@ def check_required_column(data_frame,*arg):
         return True, missing_columns
 
 
-def read_input_file(path):
+def read_input_file(path, typed=False):
     """
     This function reads the input file and returns a Pandas Data Frame.
     First it is checking for the extension and then it calls for required
@@ -52,6 +59,8 @@ def read_input_file(path):
     is other than known extensions.
     Args:
         path : path to input file
+        typed : if True csv and txt files are read with declared dtypes,
+                see helpers.read_csv_typed
 
     Returns:
          input_file : input file in the form of pandas dataframe
@@ -59,6 +68,8 @@ def read_input_file(path):
     extension_of_file = get_extension(path)
     if extension_of_file not in KNOWN_EXTENSION.keys():
         raise custom_exception.FileExtensionError
+    elif typed and extension_of_file in TYPED_CSV_SEPARATOR:
+        return read_csv_typed(path, TYPED_CSV_SEPARATOR[extension_of_file], categorical=False)
     else:
         return KNOWN_EXTENSION[extension_of_file](path, header=0)
 
@@ -1,11 +1,21 @@
 import collections
+import hashlib
+import json
 from operator import itemgetter
 import os
 from operator import itemgetter
 
 import numpy as np
 import pandas as pd
-
+from pandas.api.types import is_categorical_dtype
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+except ImportError:
+    pa = None
+
+from cache import read_excel_cached
 import constants as const
 from formula import Formula
 from formulaschema import FormulaSchema
@@ -22,6 +32,7 @@ LEVEL_0_COL = const.LEVEL_0_COL
 LEVEL_1_COL = const.LEVEL_1_COL
 VAR_COL = const.VAR_COL
 VAL_COL = const.VAL_COL
+TYPED_CSV_SEPARATOR = {'.csv': ',', '.txt': '\t'}
 
 
 # def set_global_isotope_dict(isotope_dict):
@@ -31,6 +42,43 @@ VAL_COL = const.VAL_COL
 def get_global_isotope_dict():
      return const.ISOTOPE_NA_MASS
 
+
+def _build_isotope_tables(isotope_dict):
+    """
+    This function flattens the nested isotope dictionary into lookup tables
+    so that the isotope helpers below cost a single dict hit per call. Every
+    isotope with an amu entry also gets an integer id, ids index into the
+    array tables which can be used by numpy based code paths.
+    Args:
+        isotope_dict: constant dictionary containing natural abundance information
+        of different isotopes
+    Returns:
+        tables: tuple of (element, amu, na, natural isotope) dictionaries, isotope
+        id dictionary and (amu, na, natural isotope id) arrays indexed by isotope id
+    """
+    iso_element = dict(isotope_dict[const.KEY_ELE])
+    iso_amu = dict(isotope_dict[const.KEY_AMU])
+    iso_na = dict(isotope_dict[const.KEY_NA])
+    iso_natural = dict(isotope_dict[const.KEY_NAT_ISO])
+
+    isotopes = sorted(iso_amu, key=lambda iso: (iso_amu[iso], iso))
+    iso_ids = dict((iso, iso_id) for iso_id, iso in enumerate(isotopes))
+    amu_array = np.array([iso_amu[iso] for iso in isotopes], dtype=np.float64)
+    na_array = np.array([iso_na[iso] for iso in isotopes], dtype=np.float64)
+    natural_id_array = np.array([iso_ids[iso_natural[iso]] for iso in isotopes],
+                                dtype=np.int64)
+    for array in (amu_array, na_array, natural_id_array):
+        array.flags.writeable = False
+
+    return (iso_element, iso_amu, iso_na, iso_natural, iso_ids,
+            amu_array, na_array, natural_id_array)
+
+
+(ISOTOPE_ELEMENT, ISOTOPE_AMU, ISOTOPE_NA, ISOTOPE_NATURAL, ISOTOPE_IDS,
+ ISOTOPE_AMU_ARRAY, ISOTOPE_NA_ARRAY,
+ ISOTOPE_NATURAL_ID_ARRAY) = _build_isotope_tables(const.ISOTOPE_NA_MASS)
+
+
 def get_atomic_weight(element):
     try:
         return const.ELE_ATOMIC_WEIGHTS[element]
@@ -39,25 +87,27 @@ def get_atomic_weight(element):
 
 
 def check_if_isotope_in_dict(iso):
-    return const.ISOTOPE_NA_MASS['element'].has_key(iso)
+    return iso in ISOTOPE_ELEMENT
 
 
 def get_isotope_element(iso):
     try:
-        return const.ISOTOPE_NA_MASS['element'][iso]
+        return ISOTOPE_ELEMENT[iso]
     except KeyError:
         raise KeyError('Check available isotope list', iso)
 
 
 def get_isotope_mass(iso):
     try:
-        return const.ISOTOPE_NA_MASS['amu'][iso]
+        return ISOTOPE_AMU[iso]
     except KeyError:
         raise KeyError('Check available isotope list', iso)
 
 
 def get_isotope_na(iso, isotope_dict=const.ISOTOPE_NA_MASS):
     try:
+        if isotope_dict is const.ISOTOPE_NA_MASS:
+            return ISOTOPE_NA[iso]
         return isotope_dict['naValue'][iso]
     except KeyError:
         raise KeyError('Check available isotope list', iso)
@@ -65,7 +115,19 @@ def get_isotope_na(iso, isotope_dict=const.ISOTOPE_NA_MASS):
 
 def get_isotope_natural(iso):
     try:
-        return const.ISOTOPE_NA_MASS['naturalIsotope'][iso]
+        return ISOTOPE_NATURAL[iso]
+    except KeyError:
+        raise KeyError('Check available isotope list', iso)
+
+
+def get_isotope_id(iso):
+    """
+    This function returns the integer id of an isotope, the id is the
+    position of the isotope in ISOTOPE_AMU_ARRAY, ISOTOPE_NA_ARRAY and
+    ISOTOPE_NATURAL_ID_ARRAY
+    """
+    try:
+        return ISOTOPE_IDS[iso]
     except KeyError:
         raise KeyError('Check available isotope list', iso)
 
@@ -80,12 +142,13 @@ def label_dict_to_key(label_dict):
     return key
 
 
-def read_file(path):
+def read_file(path, typed=False):
     """
-    This function reads the input file in xls, xlsx, txt and csv
-    format
+    This function reads the input file in xls, xlsx, txt, csv, parquet
+    and feather format
     Args:
         path : path to input file
+        typed : if True csv and txt files are read with read_csv_typed
 
     Returns:
          input_file : input file in the form of pandas dataframe
@@ -94,7 +157,11 @@ def read_file(path):
     excel = ['.xls', '.xlsx']
 
     if os.path.splitext(path)[1] in excel:
-        input_file = pd.read_excel(path, header=0)
+        input_file = read_excel_cached(path, header=0)
+
+    elif typed and os.path.splitext(path)[1] in TYPED_CSV_SEPARATOR:
+        input_file = read_csv_typed(path, TYPED_CSV_SEPARATOR[os.path.splitext(path)[1]],
+                                    categorical=False)
 
     elif os.path.splitext(path)[1] == '.csv':
         input_file = pd.read_csv(path, header=0)
@@ -102,12 +169,196 @@ def read_file(path):
     elif os.path.splitext(path)[1] == '.txt':
         input_file = pd.read_table(path, header=0)
 
+    elif os.path.splitext(path)[1] == '.parquet':
+        input_file = read_input_parquet(path)
+
+    elif os.path.splitext(path)[1] in ['.feather', '.arrow']:
+        input_file = read_input_feather(path)
+
     else:
-        raise IOError('only csv/xls/xlsx/txt extensions are allowed')
+        raise IOError('only csv/xls/xlsx/txt/parquet/feather extensions are allowed')
 
     return input_file
 
 
+CSV_STRING_COLUMNS = [const.NAME_COL, const.LABEL_COL, const.FORMULA_COL]
+CSV_SCHEMA_CACHE = {}
+CSV_SCHEMA_CACHE_SIZE = 32
+CSV_SCHEMA_SAMPLE_ROWS = 100
+
+
+def cache_csv_schema(key, schema):
+    if len(CSV_SCHEMA_CACHE) >= CSV_SCHEMA_CACHE_SIZE:
+        CSV_SCHEMA_CACHE.clear()
+    CSV_SCHEMA_CACHE[key] = dict(schema)
+
+
+def get_csv_schema(sample_df, categorical=True):
+    """
+    This function returns the dtypes with which a csv file is read, from
+    sample_df having the first rows of the file. Name, Label and Formula are
+    strings (categorical if categorical is True), columns which are numeric
+    in the sample are float64 and other columns, for ex. text columns of
+    MultiQuant exports, are not declared and their type is inferred. Schemas
+    are cached by header, so files with the same layout share the schema,
+    including the corrections done in read_csv_typed. A copy of the cached
+    schema is returned.
+    Args:
+        sample_df : first rows of the file
+        categorical : read string columns as categorical
+
+    Returns:
+        schema : dict of column name and dtype
+    """
+    key = (tuple(sample_df.columns), categorical)
+    try:
+        return dict(CSV_SCHEMA_CACHE[key])
+    except KeyError:
+        string_dtype = 'category' if categorical else object
+        schema = {}
+        for column in sample_df.columns:
+            if column in CSV_STRING_COLUMNS:
+                schema[column] = string_dtype
+            elif sample_df[column].dtype.kind in 'iuf':
+                schema[column] = np.float64
+        cache_csv_schema(key, schema)
+        return schema
+
+
+def read_csv_typed(path, sep=',', categorical=True):
+    """
+    This function reads a csv/txt file with declared dtypes (see
+    get_csv_schema) instead of letting pandas sniff the type of every column.
+    If a column which is numeric in the first rows has text values later on,
+    the file is read again with only the string columns declared and the
+    cached schema no longer declares that column. Validation of input files
+    applies functions on the string columns, so it needs categorical=False.
+    Args:
+        path : path to input file
+        sep : column separator
+        categorical : read Name, Label and Formula as categorical
+
+    Returns:
+        input_file : input file in the form of pandas dataframe
+    """
+    sample_df = pd.read_csv(path, sep=sep, header=0, nrows=CSV_SCHEMA_SAMPLE_ROWS)
+    schema = get_csv_schema(sample_df, categorical)
+    try:
+        return pd.read_csv(path, sep=sep, header=0, dtype=schema)
+    except ValueError:
+        input_file = pd.read_csv(path, sep=sep, header=0, dtype={
+            column: dtype for column, dtype in schema.iteritems() if column in CSV_STRING_COLUMNS})
+        for column, dtype in schema.items():
+            if dtype is not np.float64:
+                continue
+            if input_file[column].dtype.kind in 'iuf':
+                input_file[column] = input_file[column].astype(np.float64)
+            else:
+                del schema[column]
+        cache_csv_schema((tuple(sample_df.columns), categorical), schema)
+        return input_file
+
+
+def check_pyarrow_installed():
+    """
+    This function raises ImportError if pyarrow, which is needed for
+    parquet and feather files, is not installed.
+    """
+    if pa is None:
+        raise ImportError('pyarrow is required to read or write parquet/feather files')
+
+
+def to_categorical_columns(df):
+    """
+    This function converts Name, Formula, Label and Sample columns of df
+    to categorical, these are stored dictionary encoded in parquet and
+    feather files.
+    Args:
+        df : dataframe to be converted
+
+    Returns:
+        df : copy of df with categorical columns
+    """
+    df = df.copy()
+    for column in const.CATEGORICAL_COLUMNS:
+        if column in df.columns and not is_categorical_dtype(df[column]):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def to_plain_columns(df):
+    """
+    This function converts categorical columns of df back to plain
+    columns of their category values.
+    """
+    for column in df.columns:
+        if is_categorical_dtype(df[column]):
+            df[column] = np.asarray(df[column])
+    return df
+
+
+def read_parquet(path, header=0, categorical=True):
+    """
+    This function reads a parquet file, the file is memory mapped. path can
+    also be a directory of parquet files (see output.ResultWriter).
+    header is only there to have the same signature as pandas readers.
+    If categorical is False, Name, Formula, Label and Sample are returned
+    as plain columns, as needed by the validation of input files.
+    """
+    check_pyarrow_installed()
+    if os.path.isdir(path):
+        df = parquet.read_table(path).to_pandas().reset_index(drop=True)
+    else:
+        df = parquet.read_table(pa.memory_map(path, 'r')).to_pandas()
+    return to_categorical_columns(df) if categorical else to_plain_columns(df)
+
+
+def read_feather(path, header=0, categorical=True):
+    """
+    This function reads a feather (arrow IPC) file.
+    header is only there to have the same signature as pandas readers.
+    If categorical is False, Name, Formula, Label and Sample are returned
+    as plain columns, as needed by the validation of input files.
+    """
+    check_pyarrow_installed()
+    df = feather.read_feather(path)
+    return to_categorical_columns(df) if categorical else to_plain_columns(df)
+
+
+def read_input_parquet(path, header=0):
+    """
+    This function reads a parquet input file with plain columns.
+    """
+    return read_parquet(path, header, categorical=False)
+
+
+def read_input_feather(path, header=0):
+    """
+    This function reads a feather input file with plain columns.
+    """
+    return read_feather(path, header, categorical=False)
+
+
+def write_parquet(df, path):
+    """
+    This function writes df to a parquet file with Name, Formula, Label
+    and Sample columns dictionary encoded.
+    """
+    check_pyarrow_installed()
+    table = pa.Table.from_pandas(to_categorical_columns(df))
+    parquet.write_table(table, path)
+
+
+def write_feather(df, path):
+    """
+    This function writes df to a feather (arrow IPC) file with Name,
+    Formula, Label and Sample columns dictionary encoded. Feather files
+    do not store the index, so it is reset.
+    """
+    check_pyarrow_installed()
+    feather.write_feather(to_categorical_columns(df).reset_index(drop=True), path)
+
+
 def json_to_df(json_input):
     """
     This function takes input data in the form of json format and converts
@@ -174,6 +425,50 @@ def get_unique_values(df, column_name):
     return unique_val_list
 
 
+def apply_on_distinct(function, *columns):
+    """
+    This function applies function on every row of the given columns, but
+    evaluates it only once for each distinct value (or combination of values
+    for more than one column) and broadcasts the result back to the rows.
+    Missing values (None and NaN) of a column are one distinct value, the
+    function gets the missing value of the first such row. The function must
+    only depend on its arguments, then this gives the same results as
+    applying it row by row.
+    :param function: function taking one value of each column
+    :param columns: series of equal length
+    :return: numpy object array of function results for each row
+    """
+    combined_codes = np.zeros(len(columns[0]), dtype=np.int64)
+    for column in columns:
+        # missing values have code -1, shifting by one gives them a code of their own
+        codes, uniques = pd.factorize(column)
+        combined_codes = combined_codes * (len(uniques) + 1) + codes + 1
+        combined_codes = pd.factorize(combined_codes)[0]
+    distinct_codes, first_rows, row_codes = np.unique(combined_codes, return_index=True,
+                                                      return_inverse=True)
+    column_values = [column.values for column in columns]
+    results = np.empty(len(first_rows), dtype=object)
+    for position, row in enumerate(first_rows):
+        results[position] = function(*[values[row] for values in column_values])
+    return results[row_codes]
+
+
+def create_row_keys(df, column_list, key_tuple):
+    """
+    This function creates one key tuple per row of the dataframe from the values
+    of column_list. A key tuple is created only once per distinct combination
+    and shared by all rows of the combination (see apply_on_distinct).
+    Args:
+        df : dataframe
+        column_list : columns whose values form the key, in the order of the
+                      key_tuple fields
+        key_tuple : namedtuple class of the key
+    Returns:
+        row_keys : numpy object array with a key_tuple for every row
+    """
+    return apply_on_distinct(key_tuple, *[df[column] for column in column_list])
+
+
 def get_key_from_single_value_dict(inputdict):
     if len(inputdict) == 1:
         key, value = inputdict.items()[0]
@@ -204,10 +499,45 @@ def parse_polyatom(polyatom_string):
     return (polyatom.element, polyatom.number_atoms)
 
 
+FORMULA_CACHE = {}
+FORMULA_MOL_WEIGHT_CACHE = {}
+# a dataset has up to a few hundred distinct formulas, so these caches are
+# larger than the other caches but are cleared the same way when full
+FORMULA_CACHE_SIZE = 1024
+
+
 def get_formula(formula):
-    """Parsing formula to store as an element -> number of atoms dictionary"""
-    parsed_formula = Formula(formula).parse_formula_to_elem_numatoms()
-    return parsed_formula
+    """Parsing formula to store as an element -> number of atoms dictionary.
+    Parsed formulas are cached, a copy of the cached dictionary is returned"""
+    try:
+        parsed_formula = FORMULA_CACHE[formula]
+    except KeyError:
+        parsed_formula = Formula(formula).parse_formula_to_elem_numatoms()
+        if len(FORMULA_CACHE) >= FORMULA_CACHE_SIZE:
+            FORMULA_CACHE.clear()
+        FORMULA_CACHE[formula] = parsed_formula
+    return dict(parsed_formula)
+
+
+def get_formula_mol_weight(formula):
+    """
+    This function returns the molecular weight of a formula, the weight
+    is computed once per formula and cached
+    Args:
+        formula : chemical formula string
+    Returns:
+        mw : molecular weight
+    """
+    try:
+        return FORMULA_MOL_WEIGHT_CACHE[formula]
+    except KeyError:
+        mw = 0
+        for sym, qty in get_formula(formula).iteritems():
+            mw = mw + get_atomic_weight(sym) * qty
+        if len(FORMULA_MOL_WEIGHT_CACHE) >= FORMULA_CACHE_SIZE:
+            FORMULA_MOL_WEIGHT_CACHE.clear()
+        FORMULA_MOL_WEIGHT_CACHE[formula] = mw
+        return mw
 
 
 def merge_multiple_dfs(df_list):
@@ -250,6 +580,87 @@ def get_isotope_na_value_dict(isotope_dict = const.ISOTOPE_NA_MASS):
 
     return isotope_na_value_dict
 
+
+class NATable(collections.Mapping):
+    """
+    Read only mapping of element/isotope -> natural abundance values. The values
+    are read only numpy arrays in increasing order of amu, so they can be handed
+    to the correction matrix builders directly.
+    """
+
+    def __init__(self, na_val_dict):
+        self._na_arrays = {}
+        for key, na_vals in na_val_dict.iteritems():
+            na_array = np.array(na_vals, dtype=np.float64)
+            na_array.flags.writeable = False
+            self._na_arrays[key] = na_array
+
+    def __getitem__(self, key):
+        return self._na_arrays[key]
+
+    def __iter__(self):
+        return iter(self._na_arrays)
+
+    def __len__(self):
+        return len(self._na_arrays)
+
+    def to_dict(self):
+        """
+        Returns an editable copy of the table in the form {'C':[0.99,0.11]}
+        """
+        return dict((key, na_array.tolist())
+                    for key, na_array in self._na_arrays.iteritems())
+
+
+def get_na_table(na_dict):
+    """
+    This function returns na_dict of type {'C':[0.99,0.11]} as an NATable,
+    an NATable is returned as it is.
+    """
+    if isinstance(na_dict, NATable):
+        return na_dict
+    return NATable(na_dict)
+
+
+NA_TABLE_CACHE = {}
+NA_TABLE_CACHE_SIZE = 32
+DEFAULT_NA_TABLE_KEY = 'default'
+
+
+def get_isotope_dict_hash(isotope_dict):
+    """
+    This function returns a hash of the content of an isotope dictionary, two
+    dictionaries with the same values give the same hash.
+    """
+    return hashlib.md5(json.dumps(isotope_dict, sort_keys=True)).hexdigest()
+
+
+def get_na_value_table(isotope_dict = const.ISOTOPE_NA_MASS):
+    """
+    This function returns the natural abundance values of get_na_value_dict as a
+    cached NATable. The table of the default dictionary is looked up without
+    hashing, custom dictionaries are cached by their content hash, so repeated
+    calls with an equal custom dictionary do not rebuild the table.
+    Args:
+         isotope_dict: constant dictionary containing natural abundance information
+        of different isotopes
+    Returns:
+         na_table: NATable of type {'C': array([0.99,0.11]), 'H': array([0.98,0.02])}
+    """
+    if isotope_dict is const.ISOTOPE_NA_MASS:
+        dict_hash = DEFAULT_NA_TABLE_KEY
+    else:
+        dict_hash = get_isotope_dict_hash(isotope_dict)
+    try:
+        return NA_TABLE_CACHE[dict_hash]
+    except KeyError:
+        if len(NA_TABLE_CACHE) >= NA_TABLE_CACHE_SIZE:
+            NA_TABLE_CACHE.clear()
+        na_table = NATable(_create_na_value_dict(isotope_dict))
+        NA_TABLE_CACHE[dict_hash] = na_table
+        return na_table
+
+
 def get_na_value_dict(isotope_dict = const.ISOTOPE_NA_MASS):
     """
     This function returns the dictionary of default NA values (adapted from wiki)
@@ -257,6 +668,8 @@ def get_na_value_dict(isotope_dict = const.ISOTOPE_NA_MASS):
     the order of increasing amus ([M, M+1, M+2...]) for proper creation of matrix.
     The matrix has to maintain an order such that the intensities multiplied to it
     are increasing masses, therefore order of amu is crucial.
+    The values are copied from the cached table of get_na_value_table, so the
+    returned lists can be edited freely.
     Args:
          isotope_dict: constant dictionary containing natural abundance information
         of different isotopes
@@ -280,9 +693,13 @@ def get_na_value_dict(isotope_dict = const.ISOTOPE_NA_MASS):
         O the list becomes [0.99757, 0.00038, 0.00205]
         test for this bug: test_get_na_value_dict_O in test_helpers
     """
+    return get_na_value_table(isotope_dict).to_dict()
+
+
+def _create_na_value_dict(isotope_dict):
     NA = isotope_dict[const.KEY_NA]
     amu = isotope_dict[const.KEY_AMU]
-    elements = const.ISOTOPE_NA_MASS[const.KEY_ELE]
+    elements = isotope_dict[const.KEY_ELE]
     na_val_dict = {}
     atoms = set(elements.values())
     for atom in atoms:
@@ -294,7 +711,7 @@ def get_na_value_dict(isotope_dict = const.ISOTOPE_NA_MASS):
          na_vals = [val_amu[0] for val_amu in na_val_amu]
          na_val_dict[atom] = na_vals
 
-    na_val_dict.update(get_isotope_na_value_dict())
+    na_val_dict.update(get_isotope_na_value_dict(isotope_dict))
 
     return na_val_dict
 
@@ -1,15 +1,22 @@
 import constants as con
 import custom_exception
 import dataframe_validator
+import numpy as np
 import pandas as pd
 import re
+try:
+    from pandas.util import hash_pandas_object
+except ImportError:
+    from pandas.tools.hashing import hash_pandas_object
 
-from helpers import chemformula_schema,get_formula
+from helpers import chemformula_schema,get_formula, apply_on_distinct
 from inputs.column_conventions import maven
 
 
 #getting required columns for input file
 REQUIRED_COLUMNS = [maven.NAME, maven.LABEL, maven.FORMULA]
+DUPLICATE_REPORT_COLUMNS = [con.COLUMN_STATE, con.COLUMN_NAME, con.COLUMN_ROW,
+                            con.COLUMN_DUPLICATE_OF]
 
 
 @custom_exception.handleError
@@ -77,19 +84,95 @@ def validator_column_wise(input_data_frame, axis=0, column_list=[], function_lis
     :param function_list: list of validatin function
     :return: resultant dataframe
 
-    TODO: Using vectorization can be implemented in more better way.
+    check_intensity_value is not applied cell by cell, all the columns are
+    checked at once by get_intensity_report.
     """
-    resultant_df = get_df()
+    report_list = []
     for function in function_list:
-        column_df = get_df()
+        if function is check_intensity_value:
+            report_list.append(get_intensity_report(input_data_frame, column_list))
+            continue
         for column in column_list:
-            column_df[con.COLUMN_STATE] = input_data_frame[column].apply(function)
-            column_df[con.COLUMN_NAME] = column
-            column_df[con.COLUMN_ROW] = column_df.index
-            resultant_df = resultant_df.append(column_df)
-    output_df = get_df_with_invalid_state(resultant_df)
+            report_list.append(get_report_df(apply_on_distinct(function, input_data_frame[column]),
+                                             column, input_data_frame.index.values))
+    if not report_list:
+        return get_report_df([], [], [])
+    output_df = get_df_with_invalid_state(pd.concat(report_list))
     return output_df
 
+
+def get_report_df(states, column_names, row_numbers):
+    """
+    This function returns a report df in the format ['state','column_name','row_number'],
+    indexed by the row number.
+    """
+    report_df = pd.DataFrame({con.COLUMN_STATE: states,
+                              con.COLUMN_NAME: column_names,
+                              con.COLUMN_ROW: row_numbers},
+                             index=row_numbers,
+                             columns=[con.COLUMN_STATE, con.COLUMN_NAME, con.COLUMN_ROW])
+    return report_df
+
+
+def get_intensity_state_masks(input_data_frame, column_list):
+    """
+    This function classifies all the intensity values of column_list at once.
+    Values are converted with pd.to_numeric, a value which can not be converted
+    but is not missing is checked with check_intensity_value, so the states are
+    same as of check_intensity_value applied on every cell. Missing values are
+    correct here as they are reported by check_missing.
+    :param input_data_frame: the data frame on which validation is to be applied
+    :param column_list: intensity columns
+    :return: negative_mask, invalid_mask: boolean arrays of shape (rows, columns)
+    """
+    num_rows = len(input_data_frame)
+    negative_mask = np.zeros((num_rows, len(column_list)), dtype=bool)
+    invalid_mask = np.zeros((num_rows, len(column_list)), dtype=bool)
+
+    for position, column in enumerate(column_list):
+        values = input_data_frame[column]
+        if values.dtype.kind in 'iuf':
+            numeric_values = values.values
+        else:
+            numeric_values = pd.to_numeric(values, errors='coerce').values.astype(np.float64)
+            for row in np.flatnonzero(np.isnan(numeric_values) & values.notnull().values):
+                state = check_intensity_value(values.iat[row])
+                if state == con.INTENSITY_STATE_INVALID:
+                    invalid_mask[row, position] = True
+                elif state == con.INTENSITY_STATE_NEGATIVE:
+                    negative_mask[row, position] = True
+        with np.errstate(invalid='ignore'):
+            negative_mask[:, position] |= numeric_values < 0
+
+    return negative_mask, invalid_mask
+
+
+def get_intensity_report(input_data_frame, column_list):
+    """
+    This function returns the report df of check_intensity_value for all the
+    columns in column_list, in the same order as of checking the columns one
+    after the other (column wise).
+    for ex:input_df =              Name     Label   Sample1     Sample2
+                         0           A         X      0.16        -0.18
+                         1           B         Y      -0.15        asa
+
+            output_df = row_number column_name     state
+                          1           Sample1    negative
+                          0           Sample2    negative
+                          1           Sample2    invalid_value
+
+    :param input_data_frame: the data frame on which validation is to be applied
+    :param column_list: intensity columns
+    :return: report df having only negative and invalid values
+    """
+    negative_mask, invalid_mask = get_intensity_state_masks(input_data_frame, column_list)
+    column_positions, rows = np.nonzero((negative_mask | invalid_mask).T)
+    states = np.where(invalid_mask[rows, column_positions], con.INTENSITY_STATE_INVALID,
+                      con.INTENSITY_STATE_NEGATIVE).astype(object)
+    row_numbers = input_data_frame.index.values[rows]
+    column_names = np.asarray(column_list, dtype=object)[column_positions]
+    return get_report_df(states, column_names, row_numbers)
+
 @custom_exception.handleError
 def validator_for_two_column(input_data_frame, check_column='', required_column='', function=''):
     """
@@ -120,16 +203,13 @@ def validator_for_two_column(input_data_frame, check_column='', required_column=
     :param function: validation function
     :return: resultant dataframe
     """
-    resultant_df = get_df()
-
-    resultant_df[con.COLUMN_STATE] = input_data_frame.apply(
-                                    lambda x: function(x[check_column], x[required_column]), axis=1)
-
-    resultant_df[con.COLUMN_NAME] = check_column
-    resultant_df[con.COLUMN_ROW] = resultant_df.index
+    states = apply_on_distinct(function, input_data_frame[check_column],
+                               input_data_frame[required_column])
+    resultant_df = get_report_df(states, check_column, input_data_frame.index.values)
     output_df = get_df_with_invalid_state(resultant_df)
     return output_df
 
+
 @custom_exception.handleError
 def check_missing(input_df):
     """
@@ -147,27 +227,90 @@ def check_missing(input_df):
 
     return output_df
 
+def get_first_positions(row_codes):
+    """
+    This function returns the positions of duplicate rows and of the first
+    row of each of them from the row codes numbered in order of first
+    appearance (pd.factorize). A row is the first one of its group if its
+    number is more than all previous numbers.
+    for ex: row_codes = [0, 1, 0, 2, 1]
+            duplicate_positions = [2, 4], first_positions = [0, 1]
+    """
+    running_max = np.maximum.accumulate(row_codes)
+    is_first = np.ones(len(row_codes), dtype=bool)
+    is_first[1:] = running_max[1:] > running_max[:-1]
+    duplicate_positions = np.flatnonzero(~is_first)
+    first_positions = np.flatnonzero(is_first)[row_codes[duplicate_positions]]
+    return duplicate_positions, first_positions
+
+
+def get_exact_row_codes(input_df, columns):
+    """
+    This function numbers the rows of input_df by the values of columns
+    without hashing, each column is factorized and the rows are then
+    numbered by the tuple of their column codes.
+    """
+    column_codes = [pd.factorize(input_df[column])[0] for column in columns]
+    return pd.factorize(pd.Series(zip(*column_codes)))[0]
+
+
+def check_same_rows(input_df, columns, positions, other_positions):
+    """
+    This function checks that the rows at positions have same values of
+    columns as the rows at other_positions, missing values are same.
+    """
+    column_df = input_df[columns]
+    row_values = column_df.iloc[positions].values
+    other_row_values = column_df.iloc[other_positions].values
+    same_values = (row_values == other_row_values) | \
+                  (pd.isnull(row_values) & pd.isnull(other_row_values))
+    return bool(same_values.all())
+
+
+def get_duplicate_rows(input_df, columns):
+    """
+    This function finds the rows of input_df which are duplicate on columns.
+    The columns of each row are hashed once and rows are numbered by their
+    hash (see get_first_positions). As different rows can have same hash,
+    the duplicate rows are checked against the values of their first rows,
+    if any of them differs the rows are numbered by their values instead.
+    :param input_df: data frame
+    :param columns: columns on which duplicacy is checked
+    :return: positions of duplicate rows, positions of the first row
+             having same value as each duplicate row
+    """
+    row_codes, _ = pd.factorize(hash_pandas_object(input_df[columns], index=False).values)
+    duplicate_positions, first_positions = get_first_positions(row_codes)
+    if not check_same_rows(input_df, columns, duplicate_positions, first_positions):
+        duplicate_positions, first_positions = get_first_positions(
+            get_exact_row_codes(input_df, columns))
+    return duplicate_positions, first_positions
+
+
 @custom_exception.handleError
 def check_duplicate(input_df, axis=0, column_list=[]):
     """
     This function checks for a duplicate value in a column. It
-    saves the state duplicate if any duplicate value is found.
+    saves the state duplicate for every row whose value is same as of
+    an earlier row, the earlier row is saved in duplicate_of column.
     :param input_df: data frame
     :param axis: column or row wise check
     :param column_list: colum for which we need to check duplicacy
     :return: resultant_df of validation check
     """
-    resultant_df = get_df()
+    column_dfs = []
     for column in column_list:
-            column_df = get_df()
-            column_df[con.COLUMN_STATE] = input_df.duplicated(column)
-            column_df[con.COLUMN_NAME] = '-'.join(column)
-            column_df[con.COLUMN_ROW] = column_df.index
-            resultant_df = resultant_df.append(column_df)
+        duplicate_positions, first_positions = get_duplicate_rows(input_df, column)
+        duplicate_rows = input_df.index[duplicate_positions]
+        column_dfs.append(pd.DataFrame({con.COLUMN_STATE: con.DUPLICATE_STATE,
+                                        con.COLUMN_NAME: '-'.join(column),
+                                        con.COLUMN_ROW: duplicate_rows,
+                                        con.COLUMN_DUPLICATE_OF: input_df.index[first_positions]},
+                                       index=duplicate_rows, columns=DUPLICATE_REPORT_COLUMNS))
 
-    output_df = resultant_df.loc[resultant_df[con.COLUMN_STATE] == True]
-    output_df[con.COLUMN_STATE] = con.DUPLICATE_STATE
-    return output_df
+    if not column_dfs:
+        return get_df()
+    return pd.concat(column_dfs)
 
 
 def check_intensity_value(cell_value):
@@ -324,6 +467,49 @@ def get_label(label):
             return None
 
 
+def check_validation_mode(validation_mode, sample_size=con.VALIDATION_SAMPLE_SIZE):
+    """
+    This function raises ValueError if validation mode is not one of
+    full, schema or sampled, or if sample size is not positive, as a
+    sample of no rows would skip the validation.
+    """
+    if validation_mode not in con.VALIDATION_MODES:
+        raise ValueError('validation mode must be one of {!r}, got {!r}'.format(
+            con.VALIDATION_MODES, validation_mode))
+    if not sample_size > 0:
+        raise ValueError('validation sample size must be positive, got {!r}'.format(
+            sample_size))
+
+
+def get_validation_sample(input_df, sample_size=con.VALIDATION_SAMPLE_SIZE):
+    """
+    This function returns the rows of input_df to be checked in sampled
+    validation mode. Rows are taken at random with a fixed seed, so the same
+    file is always checked on the same rows, and are kept in file order.
+    :param input_df: df to be validated
+    :param sample_size: fraction of rows if less than 1, else number of rows
+    :return: sampled df
+    """
+    if sample_size < 1:
+        num_rows = int(np.ceil(sample_size * len(input_df)))
+    else:
+        num_rows = int(sample_size)
+    if num_rows >= len(input_df):
+        return input_df
+    return input_df.sample(num_rows, random_state=0).sort_index()
+
+
+def check_numeric_columns(input_df, column_list):
+    """
+    This function checks that all the columns in column_list have numeric
+    dtype and no missing values. Schema and sampled validation modes fall
+    back to full validation if it is False, so missing values are always
+    filled.
+    """
+    return all(input_df[column].dtype.kind in 'iuf' and not input_df[column].isnull().values.any()
+               for column in column_list)
+
+
 def get_df():
     """
     This function will return a empty pandas df for now. In future there can be need where
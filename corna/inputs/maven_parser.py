@@ -1,17 +1,20 @@
 from collections import namedtuple
+import os
 
 from datum import algorithms as dat_alg
 from datum import helpers as dat_hlp
+import numpy as np
 import pandas as pd
 
 from column_conventions import maven as maven_constants
+from corna import cache
 from corna import constants as con
 from corna import input_validation
 from corna import dataframe_validator
 from corna.custom_exception import NoIntersectionError
 from corna.helpers import get_formula
 from corna.helpers import merge_two_dfs, create_dict_from_isotope_label_list
-from corna.helpers import chemformula_schema, check_column_headers
+from corna.helpers import chemformula_schema, check_column_headers, create_row_keys
 from corna.summary import return_summary_dict
 from corna.validation_report_class import ValidationReport
 
@@ -26,6 +29,8 @@ REQUIRED_COLUMNS_MAVEN_METADATA = [maven_constants.SAMPLE]
 LOGS = {}
 ISOTRACER = []
 COLUMN_DUPLICATE_CHECK = [[maven_constants.NAME, maven_constants.LABEL]]
+MAVEN_CHUNK_SIZE = 50000
+CHUNK_READERS = {'.csv': pd.read_csv, '.txt': pd.read_table}
 
 
 def maven_merge_dfs(df1, df2):
@@ -113,8 +118,8 @@ def frag_key(df):
     This function creates a fragment key column in merged data based on parent information.
     """
     try:
-        df[con.FRAG_COL] = df.apply(lambda x: MavenKey(
-            x[maven_constants.NAME], x[maven_constants.FORMULA]), axis=1)
+        df[con.FRAG_COL] = create_row_keys(
+            df, [maven_constants.NAME, maven_constants.FORMULA], MavenKey)
     except KeyError:
         raise KeyError('Missing columns in data')
     return df
@@ -230,20 +235,20 @@ def get_sample_column(maven_df):
             if column not in REQUIRED_COLUMNS_MAVEN]
 
 
-def get_validator_cls_obj(df, fn_lst):
+def get_validator_cls_obj(df, fn_lst, workers=None):
     """
     This function creates instance of ValidationReport, then
-    append all the reports which are generated after validation.
+    append all the reports which are generated after validation. If workers
+    is more than one, validation is run on row partitions of df in parallel,
+    duplicate check is always run on whole df.
     It then return the class instance.
     :param df: df on which validation check is to be performed
     :param fn_lst: list of validation fn
+    :param workers: number of workers (see ValidationReport.run_validation)
     :return:df_validator: class instance of ValidationReport
     """
     df_validator = ValidationReport()
-
-    for each_fn in fn_lst:
-        df_validator.append_df_to_global_df(each_fn(df))
-
+    df_validator.run_validation(df, fn_lst, get_global_validation_fn_lst(), workers)
     return df_validator
 
 
@@ -258,6 +263,15 @@ def get_validation_fn_lst():
     return list
 
 
+def get_global_validation_fn_lst():
+    """
+    This function returns list of validation functions which need all the
+    rows of df, other functions are run on row partitions of df (see
+    ValidationReport.run_validation).
+    """
+    return [report_duplicate_values]
+
+
 def report_missing_values(maven_df):
     return input_validation.check_missing(maven_df)
 
@@ -378,6 +392,28 @@ def get_merge_df(maven_df, metadata_df):
         return maven_merge_dfs(maven_df, metadata_df)
 
 
+def get_wide_df(maven_df, metadata_df):
+    """
+    This function keeps the maven df in its wide form (one column per sample)
+    instead of melting it. Samples not present in metadata_df are removed by
+    selecting columns and the sample columns are converted to a float block.
+    Missing intensities are filled with 0 when metadata is present, same as in
+    the merge with metadata.
+    :param maven_df: df of raw maven input file
+    :param metadata_df: df of metadata info file
+    :return wide_df: df with Name, Label, Formula and float sample columns
+    """
+    if check_df_empty(metadata_df):
+        wide_df = maven_df.copy()
+    else:
+        wide_df = filtered_data_frame(maven_df, metadata_df).copy()
+    sample_columns = get_sample_column(wide_df)
+    wide_df[sample_columns] = wide_df[sample_columns].astype(np.float64)
+    if not check_df_empty(metadata_df):
+        wide_df[sample_columns] = wide_df[sample_columns].fillna(0)
+    return wide_df
+
+
 def check_error_present(logs):
     """
     This function checks if any error is present in the validation
@@ -399,6 +435,15 @@ def check_basic_validation(path):
     return input_validation.validate_input_file(path)
 
 
+def is_columnar_file(path):
+    """
+    This function checks if the input file is a parquet or feather file,
+    these files are already typed so they are read directly without the
+    raw file conversion and basic validation of text files.
+    """
+    return dataframe_validator.get_extension(path) in dataframe_validator.COLUMNAR_EXTENSION
+
+
 def get_df_frm_path(path=None):
     """
     This function converts input file into pandas df. If no path
@@ -412,19 +457,73 @@ def get_df_frm_path(path=None):
         return pd.DataFrame()
 
 
-def get_corrected_maven_df(maven_df):
+def get_empty_validator():
+    """
+    This function returns an instance of ValidationReport with an empty
+    report, i.e. no warnings and errors.
+    """
+    df_validator = ValidationReport()
+    df_validator.append_df_to_global_df(input_validation.get_report_df([], [], []))
+    return df_validator
+
+
+def get_mode_validator(maven_df, validation_mode=con.VALIDATION_MODE_FULL,
+                       sample_size=con.VALIDATION_SAMPLE_SIZE, workers=None):
+    """
+    This function returns instance of ValidationReport for the validation
+    mode.
+    full: all the validation functions are applied on all the rows.
+    schema: only required columns and numeric dtype of sample columns are
+            checked. Values are not checked, so this is for trusted exports.
+    sampled: all the validation functions are applied on a sample of rows
+             (see input_validation.get_validation_sample), if any warning or
+             error is found the whole df is validated (full).
+    Schema and sampled modes fall back to full validation if a sample column
+    is not numeric or has missing values (see
+    input_validation.check_numeric_columns).
+    :param maven_df: df on which validation is to be performed
+    :param validation_mode: full, schema or sampled
+    :param sample_size: fraction or number of rows checked in sampled mode
+    :param workers: number of validation workers, by default rows are
+                    validated serially (see ValidationReport.run_validation)
+    :return: df_validator: class instance of ValidationReport
+    """
+    input_validation.check_validation_mode(validation_mode, sample_size)
+    validation_function_list = get_validation_fn_lst()
+    if validation_mode == con.VALIDATION_MODE_SCHEMA:
+        check_column_headers(maven_df.columns.tolist(), REQUIRED_COLUMNS_MAVEN)
+    if validation_mode != con.VALIDATION_MODE_FULL and \
+            not input_validation.check_numeric_columns(maven_df, get_sample_column(maven_df)):
+        validation_mode = con.VALIDATION_MODE_FULL
+
+    if validation_mode == con.VALIDATION_MODE_SCHEMA:
+        return get_empty_validator()
+
+    elif validation_mode == con.VALIDATION_MODE_SAMPLED:
+        sample_df = input_validation.get_validation_sample(maven_df, sample_size)
+        df_validator = get_validator_cls_obj(sample_df, validation_function_list, workers)
+        if df_validator.report_df.empty:
+            return df_validator
+
+    return get_validator_cls_obj(maven_df, validation_function_list, workers)
+
+
+def get_corrected_maven_df(maven_df, validation_mode=con.VALIDATION_MODE_FULL,
+                           sample_size=con.VALIDATION_SAMPLE_SIZE, workers=None):
     """
     This function performs validation check on df and return
     corrected df i.e. df with corrected values. The logs of
     all the validation function with applied action on warnings
     is also generated.
     :param maven_df: df on which validation is to be performed
+    :param validation_mode: full, schema or sampled (see get_mode_validator)
+    :param sample_size: fraction or number of rows checked in sampled mode
+    :param workers: number of validation workers (see get_mode_validator)
     :return: corrected_df: df after validation check
     :return: logs : logs of all the validation checks
     """
 
-    validation_function_list = get_validation_fn_lst()
-    validator = get_validator_cls_obj(maven_df, validation_function_list)
+    validator = get_mode_validator(maven_df, validation_mode, sample_size, workers)
 
     validator.generate_report()
     validator.generate_action()
@@ -464,20 +563,54 @@ def filtered_data_frame(maven_df, metadata_df):
     return filtered_maven_df
 
 
-def read_maven_file(maven_file_path, metadata_path):
+def get_validation_cache_key(paths, *key_parts):
+    """
+    This function returns the key of validation result in cache, made from
+    the content of files in paths, the validation functions and key_parts.
+    """
+    function_names = [function.__name__ for function in get_validation_fn_lst()]
+    return cache.get_content_key(paths, function_names, *key_parts)
+
+
+def read_maven_file(maven_file_path, metadata_path, wide_format=False,
+                    validation_mode=con.VALIDATION_MODE_FULL,
+                    sample_size=con.VALIDATION_SAMPLE_SIZE, cache_validation=False,
+                    workers=None):
     """
     This function reads maven and metadata file, convert it to df and
     checks for validation of files. If validation does not raise any
     error it returns mergedf with logs and iso-tracer data.
     :param maven_file_path: absolute path of maven raw file
     :param maven_sample_metadata_path: absolute path of metadatafile
+    :param wide_format: if True mergedf is kept in wide form (see get_wide_df),
+                        to be corrected with matrix_nacorr.na_correction_wide
+    :param validation_mode: full, schema or sampled (see get_mode_validator)
+    :param sample_size: fraction or number of rows checked in sampled mode
+    :param cache_validation: if True the result is cached on disk, keyed by
+                             the content of maven and metadata file and the
+                             validation settings (see corna.cache), so an
+                             unchanged file is not validated again
+    :param workers: number of validation workers (see get_mode_validator)
     :return: mergedf : merge df of Maven and Metadata File
              logs: dictionary of errors and warnings
              iso-tracer : dictionary of iso-tracer details
     """
+    if cache_validation:
+        cache_key = get_validation_cache_key([maven_file_path, metadata_path],
+                                             os.path.splitext(maven_file_path)[1],
+                                             wide_format, validation_mode, sample_size, workers)
+        return cache.read_validation_cached(cache_key, lambda: read_maven_file(
+            maven_file_path, metadata_path, wide_format, validation_mode, sample_size,
+            workers=workers))
+
     summary = {}
-    input_df = dat_hlp.read_file(maven_file_path)
-    if dat_hlp.is_maven_file(input_df):
+    if is_columnar_file(maven_file_path):
+        if not check_basic_validation(maven_file_path):
+            return get_df_frm_path(), None, None, None, None
+        input_maven_df = get_df_frm_path(maven_file_path)
+        input_validation.validate_df(input_maven_df, REQUIRED_COLUMNS_MAVEN)
+        summary[con.RAW_LCMS] = return_summary_dict(con.RAW_LCMS, input_maven_df)
+    elif dat_hlp.is_maven_file(dat_hlp.read_file(maven_file_path)):
         input_maven_df, logs = dat_alg.convert_maven_to_required_df(maven_file_path,
                                                             con.NA_LCMS)
         summary[con.RAW_LCMS] = return_summary_dict(con.RAW_LCMS, input_maven_df )
@@ -496,11 +629,125 @@ def read_maven_file(maven_file_path, metadata_path):
     else:
         metadata_df = get_df_frm_path()
         maven_df = input_maven_df
-    corrected_maven_df, validation_logs = get_corrected_maven_df(maven_df)
+    merged_df, validation_logs, isotracer_dict, unique_element_list = \
+        get_validated_merge_df(maven_df, metadata_df, wide_format, validation_mode, sample_size,
+                               workers)
     if not check_error_present(validation_logs):
-        isotracer_dict = get_isotracer_dict(corrected_maven_df)
-        merged_df = get_merge_df(corrected_maven_df, metadata_df)
-        unique_element_list = get_element_list(corrected_maven_df)
         return merged_df, validation_logs, isotracer_dict, unique_element_list, summary
     else:
-        return corrected_maven_df, logs, None, None, summary
+        return merged_df, validation_logs, None, None, summary
+
+
+def get_validated_merge_df(maven_df, metadata_df, wide_format=False,
+                           validation_mode=con.VALIDATION_MODE_FULL,
+                           sample_size=con.VALIDATION_SAMPLE_SIZE, workers=None):
+    """
+    This function performs validation check on maven df and, if validation
+    does not raise any error, merges it with metadata df. If there is an
+    error the corrected df is returned in place of the merged df.
+    :param maven_df: maven df filtered by the samples in metadata
+    :param metadata_df: df of metadata info file
+    :param wide_format: if True the merged df is kept in wide form
+    :param validation_mode: full, schema or sampled (see get_mode_validator)
+    :param sample_size: fraction or number of rows checked in sampled mode
+    :param workers: number of validation workers (see get_mode_validator)
+    :return: mergedf, validation logs, iso-tracer dict, element list
+    """
+    corrected_maven_df, validation_logs = get_corrected_maven_df(maven_df, validation_mode,
+                                                                 sample_size, workers)
+    if check_error_present(validation_logs):
+        return corrected_maven_df, validation_logs, None, None
+    isotracer_dict = get_isotracer_dict(corrected_maven_df)
+    if wide_format:
+        merged_df = get_wide_df(corrected_maven_df, metadata_df)
+    else:
+        merged_df = get_merge_df(corrected_maven_df, metadata_df)
+    unique_element_list = get_element_list(corrected_maven_df)
+    return merged_df, validation_logs, isotracer_dict, unique_element_list
+
+
+def read_maven_chunks(maven_file_path, chunksize=MAVEN_CHUNK_SIZE):
+    """
+    This function reads the maven file in chunks of chunksize rows. Only
+    csv and txt files can be read in chunks, other files are read at once
+    and returned as a single chunk. Index of each chunk continues from the
+    previous one, so row numbers in validation logs are rows of the file.
+    :param maven_file_path: absolute path of maven file
+    :param chunksize: number of rows in one chunk
+    :return: generator of dfs
+    """
+    reader = CHUNK_READERS.get(os.path.splitext(maven_file_path)[1])
+    if reader is None:
+        yield get_df_frm_path(maven_file_path)
+    else:
+        for chunk in reader(maven_file_path, header=0, chunksize=chunksize):
+            yield chunk
+
+
+def group_chunks_by_metabolite(chunks):
+    """
+    This function regroups chunks of a maven df into one df per metabolite.
+    Rows of a metabolite are contiguous in MAVEN output, so the last
+    metabolite of a chunk is carried over to the next chunk until its end
+    is seen. Rows with missing name are kept with the metabolite above them.
+    It raises ValueError if a metabolite appears again after another one.
+    :param chunks: iterable of maven dfs
+    :return: generator of maven dfs, one for each metabolite
+    """
+    seen_metabolites = set()
+
+    def check_metabolite(name):
+        if name in seen_metabolites:
+            raise ValueError('Rows of metabolite {!r} are not contiguous, '
+                             'cannot read file by metabolite'.format(name))
+        seen_metabolites.add(name)
+
+    carry_df = None
+    for chunk in chunks:
+        if carry_df is not None:
+            chunk = pd.concat([carry_df, chunk])
+        if chunk.empty:
+            continue
+        check_column_headers(chunk.columns.tolist(), REQUIRED_COLUMNS_MAVEN)
+        names = chunk[maven_constants.NAME].ffill().fillna('').values
+        starts = np.concatenate(([0], np.flatnonzero(names[1:] != names[:-1]) + 1))
+        for start, end in zip(starts[:-1], starts[1:]):
+            check_metabolite(names[start])
+            yield chunk.iloc[start:end]
+        carry_df = chunk.iloc[starts[-1]:]
+
+    if carry_df is not None and not carry_df.empty:
+        check_metabolite(carry_df[maven_constants.NAME].ffill().fillna('').values[0])
+        yield carry_df
+
+
+def read_maven_file_by_metabolite(maven_file_path, metadata_path, wide_format=False,
+                                  chunksize=MAVEN_CHUNK_SIZE,
+                                  validation_mode=con.VALIDATION_MODE_FULL,
+                                  sample_size=con.VALIDATION_SAMPLE_SIZE):
+    """
+    This function reads maven file metabolite by metabolite, so that memory
+    used is bounded by the largest metabolite and not by the file. Each
+    metabolite is validated and merged with metadata same as in
+    read_maven_file. The file must be in the Name, Label, Formula and sample
+    columns format, raw maven exports have to go through read_maven_file.
+    :param maven_file_path: absolute path of maven raw file
+    :param metadata_path: absolute path of metadatafile
+    :param wide_format: if True mergedf is kept in wide form
+    :param chunksize: number of rows read from the file at once
+    :param validation_mode: full, schema or sampled (see get_mode_validator)
+    :param sample_size: fraction or number of rows checked in sampled mode
+    :return: generator of mergedf, logs, iso-tracer dict and element list
+             for each metabolite
+    """
+    if metadata_path:
+        metadata_df = get_metadata_df(metadata_path)
+    else:
+        metadata_df = get_df_frm_path()
+
+    chunks = read_maven_chunks(maven_file_path, chunksize)
+    for metabolite_df in group_chunks_by_metabolite(chunks):
+        if not check_df_empty(metadata_df):
+            metabolite_df = filtered_data_frame(metabolite_df, metadata_df)
+        yield get_validated_merge_df(metabolite_df.copy(), metadata_df, wide_format,
+                                     validation_mode, sample_size)
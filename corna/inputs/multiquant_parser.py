@@ -1,27 +1,112 @@
 # TODO : many functions need to be documneted refer issue NCT-303
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import functools
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 import os
+import tempfile
+import time
 import warnings
 
 from datum import algorithms as dat_alg
 import pandas as pd
 
 from .column_conventions import multiquant
+from corna import cache
 from corna import constants
+from corna import dataframe_validator
+from corna import input_validation
 from corna import summary as sm
 from ..constants import INTENSITY_COL
 from corna.inputs import validation
 from ..data_model import standard_model
-from ..helpers import read_file, get_unique_values, check_column_headers
-from ..isotopomer import bulk_insert_data_to_fragment
+from ..helpers import read_file, get_unique_values, check_column_headers, create_row_keys
+from ..isotopomer import bulk_insert_data_to_fragment, resolve_mass_labels
 
 Multiquantkey = namedtuple('MultiquantKey', 'name formula parent parent_formula')
 validated_raw_tuple = namedtuple('validated_raw_mq', 'df logs')
 validated_metadata_tuple = namedtuple('validated_metadata_mq', 'df logs')
 metadata_mq_tuple = namedtuple('metadata_mq', 'df logs')
+SAMPLE_FILE_SEPARATOR = {'.csv': ',', '.txt': '\t'}
+MQ_EXPORT_EXTENSIONS = ['.txt', '.csv']
 
-def get_validated_df_and_logs(input_files, isMetadata_present, edited_data):
+
+def get_empty_logs():
+    return {'errors': [], 'warnings': {'action': [], 'message': []}}
+
+
+def get_sampled_raw_mq_logs(mq_file_path, raw_mq_df, sample_size):
+    """validates a sample of rows of raw_mq file and returns its logs
+
+    Raw file validation works on a file path, so the sampled rows (see
+    input_validation.get_validation_sample) are written to a temporary file
+    with the same extension and validated. None is returned if the file type
+    can not be sampled.
+    """
+    extension = os.path.splitext(mq_file_path)[1]
+    if extension not in SAMPLE_FILE_SEPARATOR:
+        return None
+    sample_df = input_validation.get_validation_sample(raw_mq_df, sample_size)
+    file_descriptor, sample_path = tempfile.mkstemp(suffix=extension)
+    os.close(file_descriptor)
+    try:
+        sample_df.to_csv(sample_path, sep=SAMPLE_FILE_SEPARATOR[extension], index=False)
+        return validation.data_validation_raw_df(sample_path)[1]
+    finally:
+        os.remove(sample_path)
+
+
+def get_validated_raw_mq(mq_file_path, raw_mq_df,
+                         validation_mode=constants.VALIDATION_MODE_FULL,
+                         sample_size=constants.VALIDATION_SAMPLE_SIZE, cache_validation=False):
+    """validates raw_mq file according to validation mode
+
+    Args:
+        mq_file_path: path of raw_mq file
+        raw_mq_df: df of raw_mq file
+        validation_mode: full - all the checks on all the rows,
+            schema - only the dtype of Area column is checked,
+            sampled - all the checks on a sample of rows, if any error or
+                warning is found the file is fully validated.
+            Schema and sampled modes fall back to full validation if Area
+            column is not numeric or has missing values. Otherwise raw_mq_df
+            is returned as it is, i.e. unlike full validation duplicate rows
+            are not dropped, so these modes are for trusted exports.
+        sample_size: fraction or number of rows checked in sampled mode
+        cache_validation: if True the result is cached on disk, keyed by the
+            content of raw_mq file and the validation settings (see corna.cache)
+
+    Returns:
+        validated_raw_mq: tuple of validated df and logs of raw_mq file
+    """
+    input_validation.check_validation_mode(validation_mode, sample_size)
+    if cache_validation:
+        cache_key = cache.get_content_key([mq_file_path], os.path.splitext(mq_file_path)[1],
+                                          constants.RAW_MQ_DICT, validation_mode, sample_size)
+        return cache.read_validation_cached(cache_key, lambda: get_validated_raw_mq(
+            mq_file_path, raw_mq_df, validation_mode, sample_size))
+
+    if validation_mode != constants.VALIDATION_MODE_FULL and \
+            not input_validation.check_numeric_columns(raw_mq_df, constants.AREA_COLUMN_RAWFILE):
+        validation_mode = constants.VALIDATION_MODE_FULL
+
+    if validation_mode == constants.VALIDATION_MODE_SCHEMA:
+        return validated_raw_tuple(df=raw_mq_df, logs=get_empty_logs())
+
+    elif validation_mode == constants.VALIDATION_MODE_SAMPLED:
+        logs = get_sampled_raw_mq_logs(mq_file_path, raw_mq_df, sample_size)
+        if logs is not None and not logs['errors'] and not logs['warnings']['message']:
+            return validated_raw_tuple(df=raw_mq_df, logs=logs)
+
+    df, logs = validation.data_validation_raw_df(mq_file_path)
+    return validated_raw_tuple(df=df, logs=logs)
+
+
+def get_validated_df_and_logs(input_files, isMetadata_present, edited_data,
+                              validation_mode=constants.VALIDATION_MODE_FULL,
+                              sample_size=constants.VALIDATION_SAMPLE_SIZE,
+                              cache_validation=False):
     """takes input files, validate it and sends back merge df
 
     This function takes input_file path in form of dictionary in which
@@ -38,6 +123,10 @@ def get_validated_df_and_logs(input_files, isMetadata_present, edited_data):
         isMetadata_present: boolean to check if metadata is present or not
         edited_data: list of dictionaries containing metadata to be appended
             to the auto-created dataframe.
+        validation_mode: full, schema or sampled validation of raw_mq file
+            (see get_validated_raw_mq)
+        sample_size: fraction or number of rows checked in sampled mode
+        cache_validation: if True validation of raw_mq file is cached on disk
 
     Returns:
         validated_raw_mq: instance of DATA VALIDATION class containing
@@ -63,10 +152,9 @@ def get_validated_df_and_logs(input_files, isMetadata_present, edited_data):
 
         else:
             raw_mq_df = raw_mq
-        validated_raw_mq = validated_raw_tuple(
-            df = validation.data_validation_raw_df(input_files['mq_file_path'])[0],
-            logs = validation.data_validation_raw_df(input_files['mq_file_path'])[1]
-            )
+        validated_raw_mq = get_validated_raw_mq(input_files['mq_file_path'], raw_mq,
+                                                validation_mode, sample_size,
+                                                cache_validation)
         summary[constants.RAW_MSMS] = sm.return_summary_dict(constants.RAW_MSMS, raw_mq_df)
         if isMetadata_present:
             validated_metadata_mq = validated_metadata_tuple(
@@ -272,15 +360,12 @@ def frag_key(df):
     """
     This function creates a fragment key column in merged data based on parent information.
     """
-
-    def _extract_keys(x):
-        return Multiquantkey(x[multiquant.MQ_FRAGMENT],
-                             x[multiquant.FORMULA],
-                             x[multiquant.NAME],
-                             x[multiquant.PARENT_FORMULA])
-
     try:
-        df[multiquant.FRAG] = df.apply(_extract_keys, axis=1)
+        df[multiquant.FRAG] = create_row_keys(df, [multiquant.MQ_FRAGMENT,
+                                                   multiquant.FORMULA,
+                                                   multiquant.NAME,
+                                                   multiquant.PARENT_FORMULA],
+                                              Multiquantkey)
     except KeyError:
         raise KeyError('Missing columns in data')
     return df
@@ -311,14 +396,83 @@ def merge_mq_metadata(mq_df, metdata, sample_metdata):
 def mq_df_to_fragmentdict(merged_df, intensity_col=INTENSITY_COL):
     frag_key_df = frag_key(merged_df)
     std_model_mq = standard_model(frag_key_df, intensity_col)
+    label_counts = resolve_mass_labels((frag_name, label)
+                                       for frag_name, label_dict in std_model_mq.iteritems()
+                                       for label in label_dict)
     metabolite_frag_dict = {}
     for frag_name, label_dict in std_model_mq.iteritems():
         curr_frag_name = Multiquantkey(frag_name.name, frag_name.formula,
                                        frag_name.parent, frag_name.parent_formula)
         if metabolite_frag_dict.has_key(frag_name.parent):
             metabolite_frag_dict[frag_name.parent].update(bulk_insert_data_to_fragment(curr_frag_name,
-                                                                                       label_dict, mass=True))
+                                                                                       label_dict, mass=True,
+                                                                                       label_counts=label_counts))
         else:
             metabolite_frag_dict[frag_name.parent] = bulk_insert_data_to_fragment(curr_frag_name,
-                                                                                  label_dict, mass=True)
+                                                                                  label_dict, mass=True,
+                                                                                  label_counts=label_counts)
     return metabolite_frag_dict
+
+
+def read_multiquant_file(mq_file_path, validate=True):
+    """
+    This function reads one MultiQuant export. If validate is True the file
+    goes through the raw file validation (see validation.data_validation_raw_df)
+    and the corrected df is returned with its logs.
+    :param mq_file_path: absolute path of MultiQuant file
+    :param validate: validate the file
+    :return: mq_df, logs (None if not validated), time taken in seconds
+    """
+    start_time = time.time()
+    if validate:
+        mq_df, logs = validation.data_validation_raw_df(mq_file_path)
+    else:
+        mq_df, logs = read_file(mq_file_path), None
+    return mq_df, logs, time.time() - start_time
+
+
+def get_mq_file_list(mq_dir_path, extensions=MQ_EXPORT_EXTENSIONS):
+    """
+    This function returns sorted paths of the files in mq_dir_path with
+    one of extensions, by default MultiQuant text exports (txt/csv), so that
+    metadata files kept in the same directory are not read as exports.
+    """
+    return [os.path.join(mq_dir_path, file_name)
+            for file_name in sorted(os.listdir(mq_dir_path))
+            if dataframe_validator.get_extension(file_name) in extensions]
+
+
+def read_multiquant_dir(mq_dir_path, workers=None, use_processes=False, validate=True):
+    """
+    This function reads all MultiQuant exports of a directory and
+    concatenates them once at the end. If workers is given, each file is
+    read, and validated if validate is True, in a separate worker of a thread
+    pool, or of a process pool if use_processes is True.
+    :param mq_dir_path: directory having MultiQuant text exports
+    :param workers: number of workers, by default files are read one by one
+    :param use_processes: use processes instead of threads
+    :param validate: validate each file (see read_multiquant_file)
+    :return: mq_df: concatenated df of all files
+             logs: dict of file name and its validation logs
+             timings: dict of file name and time taken to read it in seconds
+    """
+    mq_file_list = get_mq_file_list(mq_dir_path)
+    if not mq_file_list:
+        raise IOError('No MultiQuant files found in ' + mq_dir_path)
+    read_file_fn = functools.partial(read_multiquant_file, validate=validate)
+    workers = min(workers or 1, len(mq_file_list))
+    if workers > 1:
+        pool = Pool(workers) if use_processes else ThreadPool(workers)
+        try:
+            results = pool.map(read_file_fn, mq_file_list)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [read_file_fn(mq_file_path) for mq_file_path in mq_file_list]
+
+    file_names = [os.path.basename(path) for path in mq_file_list]
+    mq_df = pd.concat([result[0] for result in results], ignore_index=True)
+    logs = OrderedDict((name, result[1]) for name, result in zip(file_names, results))
+    timings = OrderedDict((name, result[2]) for name, result in zip(file_names, results))
+    return mq_df, logs, timings
@@ -1,5 +1,6 @@
 """This module helps to do validation using validation package olmonk"""
 
+from corna import cache
 from corna import constants as const
 from olmonk import ConfigDataValidator as CDV
 from olmonk import helpers as hlp
@@ -12,7 +13,8 @@ def get_validation_df(path, required_columns=None):
     Using path of the file, it instantiates the validation class
     and use its methods to validate file and returns result of
     that. If file not passes the validation checks, then it will
-    raise an error, otherwise it will returns validated df.
+    raise an error, otherwise it will returns validated df. Excel files
+    are read through the cache of parsed files (see corna.cache).
     Args:
         path: file path for which validation is needed
 
@@ -20,7 +22,10 @@ def get_validation_df(path, required_columns=None):
     """
     # TODO: add olmonk 0.1.3 CDV to this
     try:
-        validated_df = dat_hlp.read_file(path)
+        if cache.is_excel_file(path):
+            validated_df = cache.read_cached(path, dat_hlp.read_file)
+        else:
+            validated_df = dat_hlp.read_file(path)
         return validated_df
     except Exception as e:
         raise Exception(e)
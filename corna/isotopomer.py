@@ -1,6 +1,9 @@
 from collections import namedtuple
 import numbers
 
+import numpy as np
+import pandas as pd
+
 from model import Fragment
 import helpers as hl
 
@@ -26,6 +29,12 @@ def create_fragment_from_number(name, formula, label_dict):
     return {name: frag}
 
 
+def create_fragment_from_label_count(name, formula, isotope, isotope_mass, num_labels):
+    frag = Fragment(name, formula, label_dict={isotope: num_labels},
+                    isotracer=isotope, isotope_mass=isotope_mass)
+    return {name: frag}
+
+
 def create_combined_fragment(parent_fragment_dict, daughter_fragment_dict):
     parent_key, parent_fragment = parent_fragment_dict.items()[0]
     daughter_key, daughter_fragment = daughter_fragment_dict.items()[0]
@@ -68,7 +77,77 @@ def parse_label_number(label_number):
     return hl.create_dict_from_isotope_label_list(label_number.split('_'))
 
 
-def insert_data_to_fragment_mass(frag_info, label, sample_dict, mode=None):
+def get_label_counts_from_mass(isotracers, isotope_masses, formulas, mode=None):
+    """
+    Vectorised version of Fragment.create_label_dict_from_mass. It returns the
+    number of labeled atoms for every (isotracer, isotopic mass, formula) row,
+    molecular masses are looked up once per distinct formula.
+    Args:
+        isotracers : isotope symbol of each row (eg 'C13')
+        isotope_masses : isotopic mass of each row
+        formulas : chemical formula of each row
+        mode : positive or negative mode (pos/neg), None to use the molecular mass
+    Returns:
+        num_labels : numpy array of number of labeled atoms for each row
+    Raises:
+        KeyError : if an isotracer is not present in constants
+        TypeError : if invalid mode provided
+    """
+    formula_codes, unique_formulas = pd.factorize(np.asarray(formulas, dtype=object))
+    mol_masses = np.array([hl.get_formula_mol_weight(formula)
+                           for formula in unique_formulas], dtype=np.float64)[formula_codes]
+    if mode == 'pos':
+        mol_masses = mol_masses + 1
+    elif mode == 'neg':
+        mol_masses = mol_masses - 1
+    elif mode != None:
+        raise TypeError('Only two modes possible -> pos/neg')
+
+    tracer_codes, unique_tracers = pd.factorize(np.asarray(isotracers, dtype=object))
+    tracer_ids = np.array([hl.get_isotope_id(tracer) for tracer in unique_tracers],
+                          dtype=np.int64)[tracer_codes]
+    atom_excess_mass = hl.ISOTOPE_AMU_ARRAY[tracer_ids] - \
+        hl.ISOTOPE_AMU_ARRAY[hl.ISOTOPE_NATURAL_ID_ARRAY[tracer_ids]]
+    natural = atom_excess_mass == 0
+    excess_label = (np.asarray(isotope_masses, dtype=np.float64) - mol_masses) / \
+        np.where(natural, 1, atom_excess_mass)
+    # round half away from zero, same as python round in create_label_dict_from_mass
+    num_labels = np.sign(excess_label) * np.floor(np.abs(excess_label) + 0.5)
+    num_labels[natural] = 0
+    return num_labels.astype(np.int64)
+
+
+def get_label_counts_from_mass_info(labels, parent_formulas, daughter_formulas, mode=None):
+    """
+    This function resolves the parent and daughter label counts of all mass labels
+    of a dataset in one pass. Labels are of the form isotracer_parentmass_daughtermass
+    as created from the Mass Info column (eg 'C13_191.0_111.0').
+    Args:
+        labels : mass label of each row
+        parent_formulas : parent formula of each row
+        daughter_formulas : daughter formula of each row
+        mode : positive or negative mode (pos/neg)
+    Returns:
+        parent_labels, daughter_labels : numpy arrays of number of labeled atoms
+    """
+    label_codes, unique_labels = pd.factorize(np.asarray(labels, dtype=object))
+    label_mass_dicts = [parse_label_mass(label) for label in unique_labels]
+    isotracers = np.array([str(mass_dict['tracer']) for mass_dict in label_mass_dicts],
+                          dtype=object)[label_codes]
+    parent_masses = np.array([mass_dict['parent_mass'] for mass_dict in label_mass_dicts],
+                             dtype=np.float64)[label_codes]
+    daughter_masses = np.array([mass_dict['daughter_mass'] for mass_dict in label_mass_dicts],
+                               dtype=np.float64)[label_codes]
+    parent_labels = get_label_counts_from_mass(isotracers, parent_masses, parent_formulas, mode)
+    daughter_labels = get_label_counts_from_mass(isotracers, daughter_masses, daughter_formulas, mode)
+    return parent_labels, daughter_labels
+
+
+def insert_data_to_fragment_mass(frag_info, label, sample_dict, mode=None, label_counts=None):
+    """
+    label_counts (tuple): (parent, daughter) number of labeled atoms, if already
+    resolved with get_label_counts_from_mass_info
+    """
     label_mass_dict = parse_label_mass(label)
     daughter_formula = frag_info.formula
     parent_formula = frag_info.parent_formula
@@ -77,10 +156,17 @@ def insert_data_to_fragment_mass(frag_info, label, sample_dict, mode=None):
     parent_name = frag_info.name + '_' + str(parent_mass)
     daughter_mass = label_mass_dict['daughter_mass']
     daughter_name = frag_info.name + '_' + str(daughter_mass)
-    parent_frag = create_fragment_from_mass(
-        parent_name, parent_formula, isotope, parent_mass, mode=mode)
-    daughter_frag = create_fragment_from_mass(
-        daughter_name, daughter_formula, isotope, daughter_mass, mode=mode)
+    if label_counts is None:
+        parent_frag = create_fragment_from_mass(
+            parent_name, parent_formula, isotope, parent_mass, mode=mode)
+        daughter_frag = create_fragment_from_mass(
+            daughter_name, daughter_formula, isotope, daughter_mass, mode=mode)
+    else:
+        parent_label, daughter_label = label_counts
+        parent_frag = create_fragment_from_label_count(
+            parent_name, parent_formula, isotope, parent_mass, parent_label)
+        daughter_frag = create_fragment_from_label_count(
+            daughter_name, daughter_formula, isotope, daughter_mass, daughter_label)
     frag = create_combined_fragment(parent_frag, daughter_frag)
     parent_frag_key, parent_frag_value = parent_frag.items()[0]
     label_info = parent_frag_value.check_if_unlabel()
@@ -96,15 +182,47 @@ def insert_data_to_fragment_number(frag_info, label, sample_dict):
     return add_data_fragment(frag, sample_dict, label_info, frag_info.name)
 
 
-def bulk_insert_data_to_fragment(frag_info, list_data_dict, mass=False, number=False):
+def get_mass_label_key(frag_info, label):
+    return frag_info.parent_formula, frag_info.formula, label
+
+
+def resolve_mass_labels(fragment_labels, mode=None):
+    """
+    This function resolves the parent and daughter label counts of all the
+    mass labels of a dataset with one call of get_label_counts_from_mass_info,
+    each distinct (parent formula, formula, label) is resolved once.
+    Args:
+        fragment_labels : iterable of (frag_info, mass label) pairs
+        mode : positive or negative mode (pos/neg)
+    Returns:
+        label_counts : dictionary of get_mass_label_key -> (parent, daughter)
+                       number of labeled atoms
+    """
+    label_keys = list(set(get_mass_label_key(frag_info, label)
+                          for frag_info, label in fragment_labels))
+    if not label_keys:
+        return {}
+    parent_formulas, formulas, labels = zip(*label_keys)
+    parent_labels, daughter_labels = get_label_counts_from_mass_info(
+        labels, parent_formulas, formulas, mode)
+    return dict(zip(label_keys, zip(parent_labels.tolist(), daughter_labels.tolist())))
+
+
+def bulk_insert_data_to_fragment(frag_info, list_data_dict, mass=False, number=False,
+                                 label_counts=None):
+    """
+    label_counts (dict): label counts of the mass labels of the dataset from
+    resolve_mass_labels, if not given each mass label is resolved separately
+    """
     fragment_list = {}
     for key, value in list_data_dict.iteritems():
         if number:
             fragment_list.update(
                 insert_data_to_fragment_number(frag_info, key, value))
         elif mass:
+            frag_label_counts = None if label_counts is None else \
+                label_counts[get_mass_label_key(frag_info, key)]
             fragment_list.update(
-                insert_data_to_fragment_mass(frag_info, key, value))
+                insert_data_to_fragment_mass(frag_info, key, value,
+                                             label_counts=frag_label_counts))
     return fragment_list
-
-
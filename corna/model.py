@@ -56,11 +56,7 @@ class Ion():
         Returns:
             mw (float): molecular weight
         """
-        parsed_formula = self.get_formula()
-        mw = 0
-        for sym, qty in parsed_formula.iteritems():
-            mw = mw + hl.get_atomic_weight(sym) * qty
-        return mw
+        return hl.get_formula_mol_weight(self.formula)
 
 
 class Label():
@@ -174,6 +170,8 @@ class Fragment(Ion, Label):
             isotope_mass (float): isotopic mass of the molecule
             molecular_mass (float): molecular mass of the molecule
             mode (string): positive or negative mode (pos/neg)
+            label_dict with isotracer and isotope_mass keeps the mass information
+            of a label already resolved from mass
         Returns:
             label_dict (dict) : isotope -> number of atoms
         Raises:
@@ -181,6 +179,10 @@ class Fragment(Ion, Label):
         """
         if kwargs.has_key('label_dict'):
             label_dict = kwargs['label_dict']
+            if kwargs.has_key('isotracer') and kwargs.has_key('isotope_mass'):
+                # label already resolved from mass, see isotopomer.get_label_counts_from_mass
+                self.isotracer = kwargs['isotracer']
+                self.isotope_mass = kwargs['isotope_mass']
         elif kwargs.has_key('isotracer') and kwargs.has_key('isotope_mass'):
             self.isotracer = kwargs['isotracer']
             self.isotope_mass = kwargs['isotope_mass']
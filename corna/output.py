@@ -1,71 +1,92 @@
 from collections import namedtuple
+import os
+import threading
 
+import numpy as np
 import pandas as pd
 
 import constants as const
-from helpers import concatenate_dataframes_by_col
-from helpers import label_dict_to_key, get_key_from_single_value_dict
+from helpers import write_parquet, write_feather
+from helpers import to_categorical_columns, check_pyarrow_installed
+from helpers import label_dict_to_key, get_key_from_single_value_dict, apply_on_distinct
 from inputs.column_conventions import multiquant as c
 from inputs.column_conventions.maven import NAME, SAMPLE
-from postprocess import pool_total, pool_total_MSMS
+from postprocess import get_pool_total, add_metabolite_name
 from inputs.maven_parser import MavenKey
 from inputs.multiquant_parser import Multiquantkey
 
 
 OutKey = namedtuple('OutKey', 'name formula')
 
-def convert_dict_df(nest_dict):
+OUTPUT_COLUMNS = [c.LABEL, c.SAMPLE, c.INTENSITY, c.NAME, c.FORMULA]
+
+
+def new_output_columns():
     """
-    This function convert the fragment dictionary model in dataframe
+    This function returns empty lists for the output columns and for the
+    index of the output df.
+    """
+    columns = {column: [] for column in OUTPUT_COLUMNS}
+    columns[const.LEVEL_1_COL] = []
+    return columns
+
+
+def append_std_model_columns(columns, nest_dict):
+    """
+    This function appends all the fragments of a fragment dictionary model to
+    the output columns, one row for each label and sample. Rows of a fragment
+    are indexed from 0, same as in a df built for a single fragment.
     Args:
+        columns : output columns from new_output_columns
         nest_dict : dictionary of the form ('L-Methionine', 'C5H10NO2S'):
         {'C13_1': {'sample_1': 3.18407678e-07}, 'C13_0': {'sample_1': 0.48557866}..}
-
-    Returns:
-        final_df : final dataframe
     """
     for frag_name, label_dict in nest_dict.iteritems():
-        df = lists_labeldict(frag_name, label_dict)
-    df.rename(columns={
-        const.LEVEL_0_COL: c.LABEL,
-        0: c.SAMPLE,
-        1: c.INTENSITY},
-        inplace=True)
-    df.pop(const.LEVEL_1_COL)
-
-    return df
+        num_rows = 0
+        for label, samp_dict in label_dict.iteritems():
+            columns[c.LABEL].extend([label] * len(samp_dict))
+            columns[c.SAMPLE].extend(samp_dict.iterkeys())
+            columns[c.INTENSITY].extend(samp_dict.itervalues())
+            num_rows += len(samp_dict)
+        columns[c.NAME].extend([frag_name.name] * num_rows)
+        columns[c.FORMULA].extend([frag_name.formula] * num_rows)
+        columns[const.LEVEL_1_COL].extend(xrange(num_rows))
+
+
+def build_output_df(columns):
+    """
+    This function builds the output df from the output columns in one go.
+    """
+    return pd.DataFrame({column: columns[column] for column in OUTPUT_COLUMNS},
+                        index=columns[const.LEVEL_1_COL], columns=OUTPUT_COLUMNS)
 
 
-def lists_labeldict(frag_name, label_dict):
+def convert_dict_df(nest_dict):
     """
-    This function extracts lists of metabolite name, formula, parent from
-    label dictionary model
+    This function convert the fragment dictionary model in dataframe
     Args:
-        df_list : list of dataframes to be combined
-
-        frag_name : metabolite and its formula
-
-        label_dict : dictionary with labels as keys adn intensity as intensalues
+        nest_dict : dictionary of the form ('L-Methionine', 'C5H10NO2S'):
+        {'C13_1': {'sample_1': 3.18407678e-07}, 'C13_0': {'sample_1': 0.48557866}..}
 
     Returns:
-        (df, df_list) : final dataframe or list of dataframes to be appended
-        :param parent:
+        final_df : final dataframe with Label, Sample, Intensity, Name and
+                   Formula columns
     """
-    lab = []
-    frames = []
-    for label, samp_dict in label_dict.iteritems():
-        lab.append(label)
+    columns = new_output_columns()
+    append_std_model_columns(columns, nest_dict)
+    return build_output_df(columns)
 
-        #TODO: explain why there is a need of conversion of dict to
-        #list of tuples when pd.DataFrame accept dict. Currently, it shows
-        #error - ValueError: If using all scalar values, you must pass an index
 
-        frames.append(pd.DataFrame(list(samp_dict.iteritems())))
-        df = pd.concat(frames, keys=lab).reset_index()
-        df[c.NAME] = frag_name.name
-        df[c.FORMULA] = frag_name.formula
-
-    return df
+def dict_output_to_df(dict_output, parent):
+    """
+    This function converts all the metabolites of the dictionary output
+    to a single dataframe, building the columns for all the fragments first.
+    """
+    columns = new_output_columns()
+    for metabolite, fragment_dict in dict_output.iteritems():
+        std_model = fragment_dict_to_std_model(fragment_dict, parent)
+        append_std_model_columns(columns, std_model)
+    return build_output_df(columns)
 
 
 def convert_to_df(dict_output, parent, colname='col_name'):
@@ -81,12 +102,7 @@ def convert_to_df(dict_output, parent, colname='col_name'):
         model_to_df : a pandas dataframe
         :param parent:
     """
-    df_list = []
-    for metabolite, fragment_dict in dict_output.iteritems():
-        std_model = fragment_dict_to_std_model(fragment_dict, parent)
-        model_to_df = convert_dict_df(std_model)
-        df_list.append(model_to_df)
-        model_to_df = concatenate_dataframes_by_col(df_list)
+    model_to_df = dict_output_to_df(dict_output, parent)
 
     model_to_df.rename(
         columns={c.INTENSITY: str(colname)}, inplace=True)
@@ -107,18 +123,14 @@ def convert_to_df_nacorr(dict_output, ele_corr_dict, parent, colname='col_name')
         model_to_df : a pandas dataframe
         :param parent:
     """
-    df_list = []
-    for metabolite, fragment_dict in dict_output.iteritems():
-        std_model = fragment_dict_to_std_model(fragment_dict, parent)
-        model_to_df = convert_dict_df(std_model)
-        df_list.append(model_to_df)
-        model_to_df = concatenate_dataframes_by_col(df_list)
+    model_to_df = dict_output_to_df(dict_output, parent)
 
     model_to_df.rename(
         columns={c.INTENSITY: str(colname)}, inplace=True)
-    pool_total_df = pool_total(model_to_df, str(colname))
-    model_to_df[const.INDIS_ISOTOPE_COL] = model_to_df[NAME].map(ele_corr_dict)
-    model_to_df[const.POOL_TOTAL_COL] = model_to_df.apply(lambda x: pool_total_df[x[NAME]][x[SAMPLE]], axis=1)
+    model_to_df[const.INDIS_ISOTOPE_COL] = apply_on_distinct(
+        lambda name: ele_corr_dict.get(name, np.nan), model_to_df[NAME])
+    model_to_df[const.POOL_TOTAL_COL] = get_pool_total(model_to_df, str(colname),
+                                                       [NAME, SAMPLE]).values
     return model_to_df
 
 def convert_to_df_nacorr_MSMS(dict_output, parent, colname='col_name'):
@@ -134,17 +146,13 @@ def convert_to_df_nacorr_MSMS(dict_output, parent, colname='col_name'):
         model_to_df : a pandas dataframe
         :param parent:
     """
-    df_list = []
-    for metabolite, fragment_dict in dict_output.iteritems():
-        std_model = fragment_dict_to_std_model(fragment_dict, parent)
-        model_to_df = convert_dict_df(std_model)
-        df_list.append(model_to_df)
-        model_to_df = concatenate_dataframes_by_col(df_list)
+    model_to_df = dict_output_to_df(dict_output, parent)
 
     model_to_df.rename(
         columns={c.INTENSITY: str(colname)}, inplace=True)
-    pool_total_df = pool_total_MSMS(model_to_df, str(colname))
-    model_to_df[const.POOL_TOTAL_COL] = model_to_df.apply(lambda x: pool_total_df[x[const.METABOLITE_NAME]][x[SAMPLE]], axis=1)
+    add_metabolite_name(model_to_df)
+    model_to_df[const.POOL_TOTAL_COL] = get_pool_total(model_to_df, str(colname),
+                                                       [const.METABOLITE_NAME, SAMPLE]).values
     return model_to_df
 
 
@@ -160,6 +168,138 @@ def save_to_csv(df, path):
     df.to_csv(path)
 
 
+def save_to_parquet(df, path):
+    """
+    This function saves the dataframe to specified path in parquet format,
+    Name, Formula, Label and Sample columns are dictionary encoded.
+    Needs pyarrow.
+
+    Args:
+        df : dataframe to be saved in directory
+        path : path to directory
+    """
+    write_parquet(df, path)
+
+
+def save_to_feather(df, path):
+    """
+    This function saves the dataframe to specified path in feather (arrow
+    IPC) format, Name, Formula, Label and Sample columns are dictionary
+    encoded. Needs pyarrow.
+
+    Args:
+        df : dataframe to be saved in directory
+        path : path to directory
+    """
+    write_feather(df, path)
+
+
+class ResultWriter():
+    """
+    This is an incremental writer of output dataframes. Dataframes, or
+    corrected metabolites, are written as they are computed, so the whole
+    output is never held in memory and results written before a crash are
+    kept on disk.
+
+    For a csv path each write appends rows to the file. For a parquet path
+    the path is a directory and each write adds a complete parquet file
+    (part-00000.parquet, part-00001.parquet ...) to it, the directory can be
+    read back with helpers.read_parquet. Writes are serialised with a lock
+    so the writer can be shared by threads, and each write is flushed to
+    disk. Index of dataframes is not written.
+
+    usage:
+        with ResultWriter(path) as writer:
+            for metabolite, fragment_dict in nacorr_dict.iteritems():
+                writer.write_metabolite(metabolite, fragment_dict, parent, colname)
+    """
+
+    def __init__(self, path, file_format=None):
+        """
+        :param path: path of the csv file or the parquet directory
+        :param file_format: 'csv' or 'parquet', default is taken from the
+                            extension of path
+        """
+        self.path = path
+        self.file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+        self.columns = None
+        self.num_writes = 0
+        self.lock = threading.Lock()
+        self.output_file = None
+
+        if self.file_format == 'csv':
+            self.output_file = open(path, 'w')
+        elif self.file_format == 'parquet':
+            check_pyarrow_installed()
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            for file_name in os.listdir(path):
+                if file_name.startswith('part-') and file_name.endswith('.parquet'):
+                    os.remove(os.path.join(path, file_name))
+        else:
+            raise ValueError('only csv and parquet formats are allowed')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_ordered_df(self, df):
+        """
+        All the dataframes are written with the columns of the first one.
+        """
+        if self.columns is None:
+            self.columns = df.columns.tolist()
+        elif set(df.columns) != set(self.columns):
+            raise ValueError('Columns {!r} do not match output columns {!r}'.format(
+                df.columns.tolist(), self.columns))
+        return df[self.columns]
+
+    def write(self, df):
+        """
+        This function appends df to the output.
+        :param df: dataframe to be written
+        """
+        with self.lock:
+            df = self.get_ordered_df(df)
+            if self.file_format == 'csv':
+                if self.output_file is None:
+                    raise ValueError('ResultWriter is closed')
+                df.to_csv(self.output_file, header=self.num_writes == 0, index=False)
+                self.output_file.flush()
+                os.fsync(self.output_file.fileno())
+            else:
+                part_path = os.path.join(self.path, 'part-{:05d}.parquet'.format(self.num_writes))
+                write_parquet(to_categorical_columns(df).reset_index(drop=True), part_path)
+            self.num_writes += 1
+
+    def write_metabolite(self, metabolite, fragment_dict, parent, colname='col_name',
+                         ele_corr_dict=None):
+        """
+        This function converts corrected fragments of one metabolite to
+        dataframe (see convert_to_df and convert_to_df_nacorr) and appends
+        it to the output.
+        :param metabolite: name of metabolite
+        :param fragment_dict: fragment dictionary of metabolite
+        :param parent: True if fragments have parent info (MSMS data)
+        :param colname: name of intensity column
+        :param ele_corr_dict: if given, indistinguishable isotopes and pool
+                              total columns are added as in convert_to_df_nacorr
+        """
+        if ele_corr_dict is None:
+            df = convert_to_df({metabolite: fragment_dict}, parent, colname)
+        else:
+            df = convert_to_df_nacorr({metabolite: fragment_dict}, ele_corr_dict, parent, colname)
+        self.write(df)
+
+    def close(self):
+        with self.lock:
+            if self.output_file is not None:
+                self.output_file.close()
+                self.output_file = None
+
+
 def fragment_to_output_model_mass(infopacket):
     parent_frag, daughter_frag = infopacket.frag
     daughter_formula = daughter_frag.formula
@@ -3,7 +3,7 @@ import pandas as pd
 import warnings
 
 from constants import METABOLITE_NAME
-from helpers import get_metabolite
+from helpers import get_metabolite, apply_on_distinct
 from inputs.column_conventions.maven import NAME, SAMPLE
 from isotopomer import Infopacket
 
@@ -39,10 +39,72 @@ def replace_vals(sample_int_dict):
     return dict_replaced_vals
 
 
+def get_intensity_block(fragments_dict):
+    """
+    This function collects the intensities of all fragments of a metabolite
+    in a (fragment x sample) array, so that they can be processed with numpy
+    operations instead of per value.
+
+    Args:
+        fragments_dict : dictionary of the form, example : {'Aceticacid_C13_1': [C2H4O2,
+                         {'sample_1': array([ 0.0164])}, False, 'Aceticacid'],
+                         intensities are numbers or one element arrays
+
+    Returns:
+        frag_keys : list of fragment keys, rows of block
+        sample_names : list of sample names, columns of block
+        sample_positions : for each fragment, the columns of its samples in
+                           order of its data dictionary
+        block : array of intensities with the dtype of the intensities,
+                samples missing from a fragment are zero
+    """
+    frag_keys = list(fragments_dict)
+    sample_column = {}
+    sample_positions = []
+    row_values = []
+    for frag_key in frag_keys:
+        data = fragments_dict[frag_key].data
+        sample_positions.append([sample_column.setdefault(sample_name, len(sample_column))
+                                 for sample_name in data])
+        row_values.append(np.asarray(data.values()).reshape(len(data)))
+
+    sample_names = sorted(sample_column, key=sample_column.get)
+    dtype = np.result_type(*row_values) if row_values else np.float64
+    block = np.zeros((len(frag_keys), len(sample_names)), dtype=dtype)
+    for row, values in enumerate(row_values):
+        block[row, sample_positions[row]] = values
+
+    return frag_keys, sample_names, sample_positions, block
+
+
+def block_to_fragments_dict(fragments_dict, frag_keys, sample_names, sample_positions, block):
+    """
+    This function creates fragment dictionary model from the array of
+    intensities, each fragment keeps only its own samples. Intensities which
+    were one element arrays in fragments_dict are one element arrays again,
+    other intensities are numbers.
+    """
+    new_fragments_dict = {}
+    for row, frag_key in enumerate(frag_keys):
+        frag_info = fragments_dict[frag_key]
+        data = {}
+        for column in sample_positions[row]:
+            sample_name = sample_names[column]
+            if isinstance(frag_info.data[sample_name], np.ndarray):
+                data[sample_name] = block[row, column:column + 1].copy()
+            else:
+                data[sample_name] = block[row, column].item()
+        new_fragments_dict[frag_key] = Infopacket(
+            frag_info.frag, data, frag_info.unlabeled, frag_info.name)
+
+    return new_fragments_dict
+
+
 def replace_negative_to_zero(corrected_dict):
     """
     This function replaces negative intensity values by zero from list of intensity
-    in the standardised model dictionary
+    in the standardised model dictionary. Intensities of all the fragments are
+    clipped together in a (fragment x sample) array.
 
     Args:
         corrected_dict : nested dictionary (std model) with NA corrected intensity values
@@ -51,16 +113,10 @@ def replace_negative_to_zero(corrected_dict):
         post_proc_dict : returns nested dictionary with negative values replaced
 
     """
-
-    post_proc_dict = {}
-
-    for frag_key, frag_info in corrected_dict.iteritems():
-        sample_int_dict = frag_info.data
-        dict_replaced_vals = replace_vals(sample_int_dict)
-        post_proc_dict[frag_key] = Infopacket(
-            frag_info.frag, dict_replaced_vals, frag_info.unlabeled, frag_info.name)
-
-    return post_proc_dict
+    frag_keys, sample_names, sample_positions, block = get_intensity_block(corrected_dict)
+    np.maximum(block, 0, out=block)
+    return block_to_fragments_dict(corrected_dict, frag_keys, sample_names,
+                                   sample_positions, block)
 
 
 def replace_negatives(na_corr_dict):
@@ -94,19 +150,50 @@ def sum_intensities(fragments_dict):
     Returns:
         sum_dict :  dictionary of sum of all corrected intensities for each sample
     """
-    all_frag_info = fragments_dict.values()
+    _, sample_names, _, block = get_intensity_block(fragments_dict)
+    return dict(zip(sample_names, block.sum(axis=0)))
+
 
-    sample_names = []
-    for frag in all_frag_info:
-        sample_names.extend(frag.data.keys())
-    sample_names = list(set(sample_names))
+def enrichment_with_zero_sum(fragments_dict, decimals):
+    """
+    This function calculates the fractional enrichment of a metabolite from
+    the (fragment x sample) array of intensities, with one division and one
+    rounding for all the values. Fractional enrichment is zero for samples
+    whose sum of intensities is zero.
 
-    sum_dict = {}
+    Returns:
+        fragments_fractional : fragment dictionary model of fractional enrichment values
+        zero_sum_samples : list of samples whose sum of intensities is zero
+    """
+    frag_keys, sample_names, sample_positions, block = get_intensity_block(fragments_dict)
+    sums = block.sum(axis=0)
+    is_zero_sum = sums == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        block = np.true_divide(block, sums)
+    np.around(block, decimals, out=block)
+    block[:, is_zero_sum] = 0
+    fragments_fractional = block_to_fragments_dict(fragments_dict, frag_keys, sample_names,
+                                                   sample_positions, block)
+    zero_sum_samples = [sample_names[column] for column in np.flatnonzero(is_zero_sum)]
+    return fragments_fractional, zero_sum_samples
+
+
+def warn_zero_sum_samples(zero_sum_samples):
+    """
+    This function raises a single warning for all the samples whose sum of
+    labels is zero.
 
-    for sample_name in sample_names:
-        sum_dict[sample_name] = sum(value.data.get(sample_name,0) for value in all_frag_info)
+    Args:
+        zero_sum_samples : list of tuples of metabolite name and sample name
+    """
+    if zero_sum_samples:
+        warnings.warn('sum of labels is zero for samples: ' + ', '.join(
+            '{} of {}'.format(sample_name.encode('utf-8'), name.encode('utf-8'))
+            for name, sample_name in zero_sum_samples))
 
-    return sum_dict
+
+def get_metabolite_name(fragments_dict):
+    return next(fragments_dict.itervalues()).name
 
 
 def enrichment(fragments_dict, decimals):
@@ -123,21 +210,10 @@ def enrichment(fragments_dict, decimals):
     Returns:
         fragments_fractional : fragment dictionary model of fractional enrichment values
     """
-    fragments_fractional = {}
-    sum_dict = sum_intensities(fragments_dict)
-
-    for key, value in fragments_dict.iteritems():
-        fractional_data = {}
-        for sample_name, intensity in value.data.iteritems():
-            if not sum_dict[sample_name] == 0:
-                fractional_data[sample_name] = np.around(
-                    intensity / sum_dict[sample_name], decimals)
-            else:
-                fractional_data[sample_name] = 0
-                warnings.warn("{} {} {} {}".format('sum of labels is zero for sample ', sample_name.encode('utf-8'),
-                                                   ' of ', (value.name).encode('utf-8')))
-        fragments_fractional[key] = Infopacket(
-            value.frag, fractional_data, value.unlabeled, value.name)
+    fragments_fractional, zero_sum_samples = enrichment_with_zero_sum(fragments_dict, decimals)
+    if zero_sum_samples:
+        name = get_metabolite_name(fragments_dict)
+        warn_zero_sum_samples([(name, sample_name) for sample_name in zero_sum_samples])
 
     return fragments_fractional
 
@@ -145,7 +221,8 @@ def enrichment(fragments_dict, decimals):
 def fractional_enrichment(post_processed_out, decimals=4):
     """
     This function is a wrapper over enrichment function which calculates fractional enrichment
-    for all the metabolites in the input data file
+    for all the metabolites in the input data file. Samples whose sum of labels is zero
+    are reported in a single warning.
 
     Args:
         post_processed_out : Dictionary of the form, {'Metabname_label':
@@ -157,13 +234,57 @@ def fractional_enrichment(post_processed_out, decimals=4):
                                metabolites
     """
     frac_enrichment_dict = {}
+    all_zero_sum_samples = []
 
     for metabolite, fragment_dict in post_processed_out.iteritems():
-        frac_enrichment_dict[metabolite] = enrichment(fragment_dict, decimals)
+        frac_enrichment_dict[metabolite], zero_sum_samples = enrichment_with_zero_sum(
+            fragment_dict, decimals)
+        if zero_sum_samples:
+            name = get_metabolite_name(fragment_dict)
+            all_zero_sum_samples.extend((name, sample_name) for sample_name in zero_sum_samples)
 
+    warn_zero_sum_samples(all_zero_sum_samples)
     return frac_enrichment_dict
 
 
+def get_pool_total(na_corr_df, colname, group_columns):
+    """
+    This function calculates the pool total of each row, i.e. sum of the non negative
+    corrected intensities of its group, aligned to the rows of na_corr_df. Negative and
+    missing intensities are replaced by zero and the groups are summed with a single
+    groupby transform.
+    Args:
+        na_corr_df: data frame with corrected intensities
+        colname: Name of the column that contains corrected intensities
+        group_columns: columns defining a pool, for ex. [NAME, SAMPLE]
+
+    Returns: series of pool totals with the index of na_corr_df
+
+    """
+    intensities = na_corr_df[colname].fillna(0).clip(lower=0)
+    group_keys = [na_corr_df[column].values for column in group_columns]
+    return intensities.groupby(group_keys).transform('sum')
+
+
+def group_pool_total(na_corr_df, colname, group_columns):
+    """
+    This function calculates the pool total of each group, indexed by group_columns.
+    """
+    intensities = na_corr_df[colname].fillna(0).clip(lower=0)
+    pool_total_df = intensities.groupby([na_corr_df[column].values
+                                         for column in group_columns]).sum()
+    pool_total_df.index.names = group_columns
+    return pool_total_df
+
+
+def add_metabolite_name(na_corr_df):
+    """
+    This function adds metabolite name column to na_corr_df, metabolite name is
+    computed once for each fragment name.
+    """
+    na_corr_df[METABOLITE_NAME] = apply_on_distinct(get_metabolite, na_corr_df[NAME])
+
+
 def pool_total(na_corr_df, colname):
     """
     This function calculates the pool total for each metabolite in a sample
@@ -174,9 +295,7 @@ def pool_total(na_corr_df, colname):
     Returns: grouped data frame with pool total
 
     """
-    pool_total_df = na_corr_df.groupby(([NAME, SAMPLE]))
-    pool_total_df = pool_total_df.apply(lambda x: x[x[colname] >= 0][colname].sum())
-    return pool_total_df
+    return group_pool_total(na_corr_df, colname, [NAME, SAMPLE])
 
 
 def pool_total_MSMS(na_corr_df, colname):
@@ -189,7 +308,5 @@ def pool_total_MSMS(na_corr_df, colname):
     Returns: grouped data frame with pool total
 
     """
-    na_corr_df[METABOLITE_NAME] = na_corr_df[NAME].apply(get_metabolite)
-    pool_total_df = na_corr_df.groupby(([METABOLITE_NAME, SAMPLE]))
-    pool_total_df = pool_total_df.apply(lambda x: x[x[colname] >= 0][colname].sum())
-    return pool_total_df
+    add_metabolite_name(na_corr_df)
+    return group_pool_total(na_corr_df, colname, [METABOLITE_NAME, SAMPLE])
@@ -1,3 +1,8 @@
+import functools
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
 import pandas as pd
 
 import constants as const
@@ -7,6 +12,20 @@ from inputs.column_conventions import maven as maven_file
 REQUIRED_COLUMN_LIST = [maven_file.NAME, maven_file.LABEL, maven_file.FORMULA]
 
 
+def get_row_partitions(df, chunksize=const.VALIDATION_CHUNK_SIZE):
+    """
+    This function splits df in partitions of chunksize rows, partitions keep
+    the index of df so that report row numbers are same as of the whole df.
+    """
+    if len(df) <= chunksize:
+        return [df]
+    return [df.iloc[start:start + chunksize] for start in xrange(0, len(df), chunksize)]
+
+
+def apply_validation_functions(fn_lst, df):
+    return [each_fn(df) for each_fn in fn_lst]
+
+
 class ValidationReport():
     """
     This is validation report class. This can be use to generate report of
@@ -49,14 +68,60 @@ class ValidationReport():
         """
         self.report_df = self.report_df.append(df)
 
+    def run_validation(self, df, fn_lst, global_fn_lst=(), workers=None,
+                       use_processes=False, chunksize=const.VALIDATION_CHUNK_SIZE):
+        """
+        This function runs all the validation functions on df and appends
+        their reports to the global report df. Functions which check a row
+        independently of other rows are run on row partitions of df in a
+        pool of workers, functions in global_fn_lst (for ex. duplicate check)
+        need all the rows and are run once on whole df. Partitions keep the
+        index of df, so the merged reports have the row numbers of df and are
+        appended in the order of fn_lst, same as running every function on
+        whole df.
+        :param df: df on which validation check is to be performed
+        :param fn_lst: list of validation functions
+        :param global_fn_lst: functions of fn_lst which are run on whole df
+        :param workers: number of workers, by default (or with one worker)
+                        df is not partitioned and no pool is created, as the
+                        pool overhead is larger than the gain on small files.
+        :param use_processes: use a pool of processes instead of threads,
+                              functions must then be picklable
+        :param chunksize: number of rows in a partition
+        """
+        partition_fn_lst = [each_fn for each_fn in fn_lst if each_fn not in global_fn_lst]
+        workers = workers or 1
+        partitions = get_row_partitions(df, chunksize) if workers > 1 else [df]
+        apply_functions = functools.partial(apply_validation_functions, partition_fn_lst)
+
+        if len(partitions) > 1 and partition_fn_lst:
+            pool = Pool(workers) if use_processes else ThreadPool(workers)
+            try:
+                partition_reports = pool.map(apply_functions, partitions)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            partition_reports = [apply_functions(partition) for partition in partitions]
+
+        function_reports = {}
+        for position, each_fn in enumerate(partition_fn_lst):
+            reports = [each_report[position] for each_report in partition_reports]
+            function_reports[each_fn] = reports[0] if len(reports) == 1 else pd.concat(reports)
+
+        for each_fn in fn_lst:
+            if each_fn in global_fn_lst:
+                self.append_df_to_global_df(each_fn(df))
+            else:
+                self.append_df_to_global_df(function_reports[each_fn])
+
     def generate_report(self):
         """
         This can be used to generate the validation report in
         the form of dict object which is previously in the form
         of df. Also this help getting the row number where error
-        and warnings are present. First it will find unique row
-        number then for each row it forms a df , then iterating
-        over that df it saves error and warning.
+        and warnings are present. The report df is grouped by row
+        number once, then for each row it saves error and warning.
         For ex:
         if report_df :
         row_number    column_name       state
@@ -73,8 +138,8 @@ class ValidationReport():
         """
         row_having_error = self.get_unique_row_having_error(self)
 
-        for each_row in row_having_error:
-            self.append_warning_error_dict_for_row(each_row)
+        if len(row_having_error):
+            self.append_warning_error_dict_for_rows()
 
         self.invalid_row = self.get_key_list(self.result)
         self.error_row = self.get_key_list(self.result, const.VALIDATION_ERROR)
@@ -156,45 +221,64 @@ class ValidationReport():
         With the help of action report this function perform actions on the
         row also it returns the filtered data frame after performing the action.
 
-        TODO: now using if and else to take the action because only two actions
-        are there , need to change this when there are number of actions.
+        Actions are not applied cell by cell, masks of the rows to drop and
+        of the cells to fill with 0 are made from report_df (see
+        get_action_masks), then each column is filled with one where and
+        all the rows are dropped together. If a row is dropped there is no
+        need of other action on it.
 
         for ex: action = {'action': 'ROW_WISE_ACTION',
                           '1': [{'column': 'label', 'state': 'invalid_label, 'action': 'DROP'},
                                 {'column': 'Formula', 'state': 'invalid_formula, 'action': 'DROP'}],
                           '4': [{'column': 'label', 'state': 'invalid_label, 'action': 'DROP'}]}
         actions performed are drop row 1, drop row 4.
-        In line 203: We need break because if the row is dropped there is no need
-        of other action
         :param data_frame:
         :return: data_frame
         """
         output_df = get_df()
-        list_of_rows_to_drop = []
 
         if not self.check_action_is_stop_tool():
             resultant_df = data_frame
             rows_to_take_action_on = [rows for rows in self.action
                                       if rows not in [const.VALIDATION_ACTION]]
-
-            for rows in rows_to_take_action_on:
-
-                for each_action in self.action[rows]:
-
-                    if each_action[const.VALIDATION_ACTION] == const.VALIDATION_ACTION_DROP:
-                        list_of_rows_to_drop.append(rows)
-                        action_msg = const.VALIDATION_MSG_ROW_DROPPED
-                        break
-                    else:
-                        resultant_df.set_value(rows, each_action[const.VALIDATION_COLUMN_NAME], 0)
-                        action_msg = const.VALIDATION_MSG_FILL_NA
-
-                self.action_messages.append(action_msg)
-            output_df = self.action_drop_rows(resultant_df, list_of_rows_to_drop)
+            rows_to_drop = set()
+
+            if rows_to_take_action_on:
+                drop_mask, fill_mask = self.get_action_masks(rows_to_take_action_on)
+                rows_to_drop = set(self.report_df[const.COLUMN_ROW].values[drop_mask])
+                fill_df = self.report_df.loc[fill_mask]
+                fill_df = fill_df.loc[~fill_df[const.COLUMN_ROW].isin(rows_to_drop)]
+
+                for column, column_fill_df in fill_df.groupby(const.COLUMN_NAME, sort=False):
+                    cells_to_fill = resultant_df.index.isin(column_fill_df[const.COLUMN_ROW].values)
+                    resultant_df[column] = resultant_df[column].where(~cells_to_fill, 0)
+
+            self.action_messages.extend(const.VALIDATION_MSG_ROW_DROPPED if rows in rows_to_drop
+                                        else const.VALIDATION_MSG_FILL_NA
+                                        for rows in rows_to_take_action_on)
+            output_df = self.action_drop_rows(resultant_df, list(rows_to_drop))
         self.warning_error_dict[const.VALIDATION_WARNING][const.VALIDATION_ACTION] = self.action_messages
 
         return output_df
 
+    def get_action_masks(self, rows):
+        """
+        This function returns masks over report_df of the entries of given
+        rows whose action is to drop the row and to fill the value with 0.
+        Action names are same as of get_action_name but calculated for the
+        whole report df at once.
+        :param rows: rows on which action is to be taken
+        :return: drop_mask, fill_mask
+        """
+        states = self.report_df[const.COLUMN_STATE]
+        in_rows = self.report_df[const.COLUMN_ROW].isin(rows).values
+        missing = (states == const.MISSING_STATE).values
+        required = self.report_df[const.COLUMN_NAME].isin(REQUIRED_COLUMN_LIST).values
+        duplicate = (states == const.DUPLICATE_STATE).values
+        drop_mask = in_rows & ((missing & required) | duplicate)
+        fill_mask = in_rows & missing & ~required
+        return drop_mask, fill_mask
+
     def generate_warning_error_list_of_strings(self):
         """
         This function generates the report of validation check in the form of list of
@@ -235,11 +319,13 @@ class ValidationReport():
         This is used to drop the rows in a df. Static keyword is used because
         it is behaving as plain function no need to pass self or cls argument.
         :param df: DF on which action is to be performed
-        :param row_list: list of row to dropped
+        :param row_list: list of row to dropped, these are index labels of
+                         the df (same as row_number in the report df) so
+                         that it also works on a chunk of the input file
         return: DF after row is dropped
         """
 
-        df.drop(df.index[row_list], inplace=True)
+        df.drop(row_list, inplace=True)
 
         return df
 
@@ -347,26 +433,30 @@ class ValidationReport():
             column_state_action_list.append(self.get_action_object(each_result))
         self.action[row] = column_state_action_list
 
-    def append_warning_error_dict_for_row(self, each_row):
+    def append_warning_error_dict_for_rows(self):
         """
         This function append warning and error dict for each row.
         Warning or error dictionary is key value pair where for each row
-        specific warning or error message is described.
-        :param each_row: this is row number where warning or error is present
-        :return: warning error dict for each row so that
-        """
-        row_df = self.get_slice_df_with_row(self.report_df, each_row)
-        warning_error_dict_for_row = {const.VALIDATION_WARNING: [],
-                                      const.VALIDATION_ERROR: []}
-
-        for index, row in row_df.iterrows():
-
-            warning_or_error_msg = [row[const.COLUMN_NAME], row[const.COLUMN_STATE]]
-
-            if row[const.COLUMN_STATE] in const.WARNING_STATE:
-                warning_error_dict_for_row[const.VALIDATION_WARNING].\
-                    append(warning_or_error_msg)
-            else:
-                warning_error_dict_for_row[const.VALIDATION_ERROR].\
-                    append(warning_or_error_msg)
-        self.result[row[const.COLUMN_ROW]] = warning_error_dict_for_row
\ No newline at end of file
+        specific warning or error message is described. Entries of report_df
+        are grouped by row number with a single stable sort, keeping their
+        order within the row.
+        """
+        row_codes, rows = pd.factorize(self.report_df[const.COLUMN_ROW])
+        order = np.argsort(row_codes, kind='mergesort')
+        group_starts = np.flatnonzero(np.diff(row_codes[order])) + 1
+        column_names = self.report_df[const.COLUMN_NAME].values[order]
+        states = self.report_df[const.COLUMN_STATE].values[order]
+        is_warning = self.report_df[const.COLUMN_STATE].isin(const.WARNING_STATE).values[order]
+
+        for row, positions in zip(rows, np.split(np.arange(len(order)), group_starts)):
+            warning_error_dict_for_row = {const.VALIDATION_WARNING: [],
+                                          const.VALIDATION_ERROR: []}
+            for position in positions:
+                warning_or_error_msg = [column_names[position], states[position]]
+                if is_warning[position]:
+                    warning_error_dict_for_row[const.VALIDATION_WARNING].\
+                        append(warning_or_error_msg)
+                else:
+                    warning_error_dict_for_row[const.VALIDATION_ERROR].\
+                        append(warning_or_error_msg)
+            self.result[row] = warning_error_dict_for_row
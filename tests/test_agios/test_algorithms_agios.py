@@ -63,6 +63,20 @@ def test_make_all_corr_matrices():
         algo.make_all_corr_matrices(iso_tracer, {'H': 1}, na_dict, {'C': []})
 
 
+def test_make_all_corr_matrices_shared():
+    na_values = dict(na_dict, C=[0.95, 0.05])
+    matrix_cache = {}
+    matrix_keys = {}
+    acetic_mats = algo.make_all_corr_matrices(['C13'], {'C': 2, 'H': 4, 'O': 2}, na_values,
+                                              {'C': ['H']}, matrix_cache, matrix_keys)
+    glycolic_mats = algo.make_all_corr_matrices(['C13'], {'C': 2, 'H': 4, 'O': 3}, na_values,
+                                                {'C': ['H']}, matrix_cache)
+    assert glycolic_mats['C13'] is acetic_mats['C13']
+    assert matrix_cache.keys() == [matrix_keys['C13']]
+    assert np.allclose(acetic_mats['C13'], algo.make_correction_matrix(
+        'C', {'C': 2, 'H': 4, 'O': 2}, na_values, ['H']))
+
+
 def test_fragmentdict_model():
     key = MavenKey(name='Acetic', formula='H4C2O2')
     assert algo.fragmentsdict_model(df, intensity_col='Intensity')[key]['Acetic_C13_0'].data == {'sample_1': 0.3624}
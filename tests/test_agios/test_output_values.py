@@ -1,7 +1,10 @@
 import pandas as pd
 import pytest
 
+from corna.algorithms import matrix_calc as algo
+from corna.algorithms import matrix_nacorr
 from corna.algorithms.matrix_nacorr import na_correction
+from corna.inputs.maven_parser import convert_labels_to_std
 from corna.output import convert_to_df
 from corna.constants import INTENSITY_COL
 
@@ -96,6 +99,24 @@ def test_ppm_nacorrection():
 	assert corr_dict == {'L-Methionine': {'C': [], 'N': ['O17', 'O18']}}
 
 
-
-
-
+def test_plan_correction_matrices(monkeypatch):
+	df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Glycolic', 'Glycolic', 'Lactic', 'Lactic'],
+					   'Label': ['C12 PARENT', 'C13-label-1'] * 3,
+					   'Intensity': [0.36, 0.04, 0.5, 0.1, 0.7, 0.2],
+					   'Formula': ['H4C2O2', 'H4C2O2', 'H4C2O3', 'H4C2O3', 'H6C3O3', 'H6C3O3'],
+					   'Sample': ['sample_1'] * 6})
+	metabolite_dict = algo.fragmentsdict_model(convert_labels_to_std(df, single_tracers), INTENSITY_COL)
+	eleme_corr_dicts = dict.fromkeys(metabolite_dict, {'C': ['H']})
+	corr_mats, bucket_sizes = matrix_nacorr.plan_correction_matrices(metabolite_dict, single_tracers,
+																	 na_dict, eleme_corr_dicts)
+	acetic, glycolic, lactic = sorted(metabolite_dict, key=lambda metabolite: metabolite.name)
+	assert bucket_sizes == [2, 1]
+	assert corr_mats[glycolic]['C13'] is corr_mats[acetic]['C13']
+	assert corr_mats[lactic]['C13'] is not corr_mats[acetic]['C13']
+
+	report = matrix_nacorr.get_matrix_sharing_report(bucket_sizes)
+	assert report == '3 metabolites share 2 sets of correction matrices, metabolites per set: [2, 1]'
+	messages = []
+	monkeypatch.setattr(matrix_nacorr.logger, 'debug', messages.append)
+	matrix_nacorr.nacorr_metabolite_dict(metabolite_dict, single_tracers, '', na_dict, {'C': ['H']})
+	assert messages == [report]
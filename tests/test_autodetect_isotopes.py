@@ -63,3 +63,20 @@ def test_get_isotope_element_list():
 def test_add_isotopes_list():
     assert auto.add_isotopes_list(['O', 'C']) == ['C', 'O'
                                                        '17', 'O18']
+
+
+def test_get_element_correction_dicts():
+    element_correction_dicts, borderline_report = auto.get_element_correction_dicts(
+        270, ['C5H5O', 'C14H65O9', 'C5H5O'], ['C13'])
+    assert element_correction_dicts == {'C5H5O': {'C': ['H', 'O17', 'O18']},
+                                        'C14H65O9': {'C': ['H', 'O17', 'O18']}}
+    assert [(entry['formula'], entry['element']) for entry in borderline_report] == [('C5H5O', 'H')]
+    assert element_correction_dicts['C5H5O'] == auto.get_element_correction_dict(270, 'C5H5O', ['C13'])
+
+
+def test_get_element_correction_dicts_cache_full(monkeypatch):
+    monkeypatch.setattr(auto, 'AUTODETECT_CACHE_SIZE', 2)
+    formulas = ['C5H5O', 'C14H65O9', 'C6H12O6', 'C2H4O2']
+    element_correction_dicts, _ = auto.get_element_correction_dicts(270, formulas, ['C13'])
+    assert sorted(element_correction_dicts) == sorted(formulas)
+    assert len(auto.AUTODETECT_CACHE) <= 2
@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pytest
+
+from corna import cache
+
+
+def get_counting_reader(calls):
+    def reader(path):
+        calls.append(path)
+        return pd.read_csv(path)
+    return reader
+
+
+def test_read_cached(tmpdir, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmpdir.join('cache')))
+    path = tmpdir.join('metadata.csv')
+    path.write('Sample,Cohort\ns1,c1\ns2,c2\n')
+    calls = []
+    reader = get_counting_reader(calls)
+    first_df = cache.read_cached(str(path), reader)
+    second_df = cache.read_cached(str(path), reader)
+    assert len(calls) == 1
+    assert second_df.equals(first_df)
+    assert len(os.listdir(str(tmpdir.join('cache')))) == 1
+
+
+def test_read_cached_file_changed(tmpdir, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmpdir.join('cache')))
+    path = tmpdir.join('metadata.csv')
+    path.write('Sample,Cohort\ns1,c1\n')
+    calls = []
+    reader = get_counting_reader(calls)
+    cache.read_cached(str(path), reader)
+    path.write('Sample,Cohort\ns1,c1\ns2,c2\n')
+    changed_df = cache.read_cached(str(path), reader)
+    assert len(calls) == 2
+    assert changed_df['Sample'].tolist() == ['s1', 's2']
+    assert len(os.listdir(str(tmpdir.join('cache')))) == 1
+
+
+def test_read_cached_disabled(tmpdir, monkeypatch):
+    monkeypatch.delenv(cache.CACHE_DIR_ENV, raising=False)
+    path = tmpdir.join('metadata.csv')
+    path.write('Sample,Cohort\ns1,c1\n')
+    calls = []
+    reader = get_counting_reader(calls)
+    cache.read_cached(str(path), reader)
+    cache.read_cached(str(path), reader)
+    assert len(calls) == 2
+
+
+def test_read_cached_missing_file(tmpdir, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmpdir.join('cache')))
+    with pytest.raises(IOError):
+        cache.read_cached(str(tmpdir.join('missing.csv')), pd.read_csv)
+
+
+def test_read_validation_cached(tmpdir, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmpdir.join('cache')))
+    first_path = tmpdir.join('maven.csv')
+    second_path = tmpdir.join('maven_upload.csv')
+    first_path.write('Name,Label\nAcetic,C12 PARENT\n')
+    second_path.write('Name,Label\nAcetic,C12 PARENT\n')
+    calls = []
+
+    def validate():
+        calls.append(1)
+        return pd.DataFrame({'Name': ['Acetic']}), {'errors': [], 'warnings': {}}
+
+    first_key = cache.get_content_key([str(first_path), None], 'full')
+    assert first_key == cache.get_content_key([str(second_path), None], 'full')
+    assert first_key != cache.get_content_key([str(first_path), None], 'sampled')
+    cache.read_validation_cached(first_key, validate)
+    df, logs = cache.read_validation_cached(first_key, validate)
+    assert len(calls) == 1
+    assert df['Name'].tolist() == ['Acetic']
+    assert logs == {'errors': [], 'warnings': {}}
+
+
+def test_write_pickle_failure(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    with pytest.raises(Exception):
+        cache.write_pickle(lambda: None, cache_dir, os.path.join(cache_dir, 'lambda.pkl'))
+    assert os.listdir(cache_dir) == []
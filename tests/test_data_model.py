@@ -30,3 +30,37 @@ def test_to_float():
 
 
 
+def test_std_model_multiple_fragments():
+    merged_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Lactic', 'Acetic'],
+                              'Label': ['C13_0', 'C13_0', 'C13_0', 'C13_0'],
+                              'INTENSITY_COL': [0.1, 0.2, 0.3, 0.4],
+                              'Formula': ['H4C2O2', 'H4C2O2', 'C3H6O3', 'H4C2O2'],
+                              'Sample': ['sample_1', 'sample_2', 'sample_1', 'sample_1']})
+    df = frag_key(merged_df)
+    std_model = {MavenKey(name='Acetic', formula='H4C2O2'): {'C13_0': {'sample_1': 0.1, 'sample_2': 0.2}},
+                 MavenKey(name='Lactic', formula='C3H6O3'): {'C13_0': {'sample_1': 0.3}}}
+    assert fp.standard_model(df, intensity_col='INTENSITY_COL') == std_model
+
+
+def test_std_model_missing_label():
+    merged_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Acetic'],
+                              'Label': ['C13_0', np.nan, 'C13_1'],
+                              'INTENSITY_COL': [0.1, 0.2, 0.3],
+                              'Formula': ['H4C2O2', 'H4C2O2', 'H4C2O2'],
+                              'Sample': ['sample_1', 'sample_1', np.nan]})
+    df = frag_key(merged_df)
+    std_model = {MavenKey(name='Acetic', formula='H4C2O2'): {'C13_0': {'sample_1': 0.1}}}
+    assert fp.standard_model(df, intensity_col='INTENSITY_COL') == std_model
+
+
+def test_std_model_wide():
+    wide_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Lactic'],
+                            'Label': ['C13_0', 'C13_1', 'C13_0'],
+                            'Formula': ['H4C2O2', 'H4C2O2', 'C3H6O3'],
+                            'sample_1': [0.1, 0.2, 0.3],
+                            'sample_2': [1, 2, 3]})
+    df = frag_key(wide_df)
+    std_model = {MavenKey(name='Acetic', formula='H4C2O2'): {'C13_0': {'sample_1': 0.1, 'sample_2': 1.0},
+                                                             'C13_1': {'sample_1': 0.2, 'sample_2': 2.0}},
+                 MavenKey(name='Lactic', formula='C3H6O3'): {'C13_0': {'sample_1': 0.3, 'sample_2': 3.0}}}
+    assert fp.standard_model_wide(df, ['sample_1', 'sample_2']) == std_model
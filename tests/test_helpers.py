@@ -1,5 +1,8 @@
+import collections
+import copy
 import os
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -59,6 +62,18 @@ def test_get_isotope_natural_keyerror():
         help.get_isotope_natural('PP')
 
 
+def test_get_isotope_id():
+    iso_id = help.get_isotope_id('C13')
+    assert help.ISOTOPE_AMU_ARRAY[iso_id] == 13
+    assert help.ISOTOPE_NA_ARRAY[iso_id] == 0.0111
+    assert help.ISOTOPE_NATURAL_ID_ARRAY[iso_id] == help.get_isotope_id('C12')
+
+
+def test_get_isotope_id_keyerror():
+    with pytest.raises(KeyError):
+        help.get_isotope_id('C14')
+
+
 def test_get_isotope_keyerror():
     assert not help.check_if_isotope_in_dict('Ind5')
 
@@ -112,6 +127,22 @@ def test_create_dict_from_isotope_label_list_no_isotope():
     assert err.value.message == 'The key must be an isotope'
 
 
+def test_create_row_keys():
+    Key = collections.namedtuple('Key', 'name formula')
+    df = pd.DataFrame({'Name': ['a', 'b', 'a'], 'Formula': ['C2', 'C2', 'C2']})
+    row_keys = help.create_row_keys(df, ['Name', 'Formula'], Key)
+    assert list(row_keys) == [Key('a', 'C2'), Key('b', 'C2'), Key('a', 'C2')]
+    assert row_keys[0] is row_keys[2]
+
+
+def test_create_row_keys_missing_values():
+    Key = collections.namedtuple('Key', 'name formula')
+    df = pd.DataFrame({'Name': ['a', None, None], 'Formula': ['C2', 'C2', 'C2']})
+    row_keys = help.create_row_keys(df, ['Name', 'Formula'], Key)
+    assert list(row_keys) == [Key('a', 'C2'), Key(None, 'C2'), Key(None, 'C2')]
+    assert row_keys[1] is row_keys[2]
+
+
 def test_get_key_from_single_value_dict():
     assert help.get_key_from_single_value_dict({'C13':1}) == 'C13'
 
@@ -136,10 +167,51 @@ def test_get_formula():
     assert help.get_formula('C6H12O6') == {'C':6, 'H':12, 'O':6}
 
 
+def test_get_formula_cached_copy():
+    parsed_formula = help.get_formula('C6H12O6')
+    parsed_formula['C'] = 0
+    assert help.get_formula('C6H12O6') == {'C':6, 'H':12, 'O':6}
+
+
+def test_get_formula_mol_weight():
+    assert help.get_formula_mol_weight('H2') == 2 * help.get_atomic_weight('H')
+
+
 def test_get_na_value_dict_O():
     assert help.get_na_value_dict()['O'] == [0.9976, 0.0004, 0.002]
 
 
+def test_get_na_value_table():
+    na_table = help.get_na_value_table()
+    assert list(na_table['O']) == [0.9976, 0.0004, 0.002]
+    assert help.get_na_value_table() is na_table
+    with pytest.raises(ValueError):
+        na_table['O'][0] = 0.5
+
+
+def test_get_na_value_table_custom_dict():
+    isotope_dict = copy.deepcopy(help.get_global_isotope_dict())
+    isotope_dict['naValue']['H2'] = 0.01
+    na_table = help.get_na_value_table(isotope_dict)
+    assert na_table is not help.get_na_value_table()
+    assert na_table is help.get_na_value_table(copy.deepcopy(isotope_dict))
+    assert na_table['H'][1] == 0.01
+
+
+def test_get_na_table():
+    na_table = help.get_na_value_table()
+    assert help.get_na_table(na_table) is na_table
+    na_table = help.get_na_table({'C': [0.99, 0.01]})
+    assert isinstance(na_table, help.NATable)
+    assert list(na_table['C']) == [0.99, 0.01]
+
+
+def test_get_na_value_dict_editable():
+    na_dict = help.get_na_value_dict()
+    na_dict['H'][0] = 0.989
+    assert help.get_na_value_dict()['H'][0] != 0.989
+
+
 def test_filter_df():
     df = pd.DataFrame({'Name': ['a', 'b', 'c'], 'Formula': ['a', 'b', 'c']})
     colval = {'Name': ['a']}
@@ -153,6 +225,20 @@ def test_get_unique_val():
         assert err.value.message == 'Column NAME not found in dataframe'
 
 
+def test_apply_on_distinct():
+    calls = []
+
+    def check(label, formula):
+        calls.append((label, formula))
+        return '{}:{}'.format(label, formula)
+
+    labels = pd.Series(['C13-label-1', 'C12 PARENT', 'C13-label-1', None])
+    formulas = pd.Series(['C2H4O2', 'C2H4O2', 'C2H4O2', 'C2H4O2'])
+    result = help.apply_on_distinct(check, labels, formulas)
+    assert list(result) == ['C13-label-1:C2H4O2', 'C12 PARENT:C2H4O2', 'C13-label-1:C2H4O2', 'None:C2H4O2']
+    assert len(calls) == 3
+
+
 def test_concatenate_dataframes_by_col():
     df_1= pd.DataFrame({'Name':['a', 'b'], 'Formula':['d', 'e']})
     df_2 = pd.DataFrame({'mode':['+', '+']})
@@ -177,3 +263,78 @@ def test_get_metabolite_fragment():
 
 def test_first_sub_second():
     assert help.first_sub_second([1, 2], [3, 4]) == [1, 2]
+
+
+def test_to_categorical_columns():
+    df = pd.DataFrame({'Name': ['Acetic', 'Acetic'], 'Sample': ['s1', 's2'], 'Intensity': [1.0, 2.0]})
+    categorical_df = help.to_categorical_columns(df)
+    assert str(categorical_df['Name'].dtype) == 'category'
+    assert str(categorical_df['Sample'].dtype) == 'category'
+    assert categorical_df['Intensity'].dtype == df['Intensity'].dtype
+    assert df['Name'].dtype == object
+
+
+@pytest.mark.parametrize('extension', ['.parquet', '.feather'])
+def test_read_write_columnar_file(tmpdir, extension):
+    pytest.importorskip('pyarrow')
+    df = pd.DataFrame({'Name': ['Acetic', 'Acetic'], 'Label': ['C13_0', 'C13_1'],
+                       'Formula': ['C2H4O2', 'C2H4O2'], 'Sample': ['s1', 's1'], 'Intensity': [1.0, 2.0]})
+    path = str(tmpdir.join('output' + extension))
+    if extension == '.parquet':
+        help.write_parquet(df, path)
+        result_df = help.read_parquet(path)
+    else:
+        help.write_feather(df, path)
+        result_df = help.read_feather(path)
+    assert str(result_df['Label'].dtype) == 'category'
+    input_df = help.read_file(path)
+    assert input_df[df.columns.tolist()].equals(df)
+
+
+def test_read_csv_typed(tmpdir):
+    path = tmpdir.join('maven_typed.csv')
+    path.write('Name,Label,Formula,sample_typed_1,sample_typed_2\n'
+               'Acetic,C12 PARENT,C2H4O2,1,0.5\n'
+               'Acetic,C13-label-1,C2H4O2,,2\n')
+    df = help.read_csv_typed(str(path))
+    assert str(df['Name'].dtype) == 'category'
+    assert df['sample_typed_1'].dtype == 'float64'
+    assert df['sample_typed_1'].isnull().tolist() == [False, True]
+    plain_df = help.read_file(str(path), typed=True)
+    assert plain_df['Label'].dtype == object
+
+
+def test_read_csv_typed_invalid_intensity(tmpdir):
+    path = tmpdir.join('maven_invalid.csv')
+    path.write('Name,Label,Formula,sample_invalid_1,sample_invalid_2\n'
+               'Acetic,C12 PARENT,C2H4O2,abc,0.5\n')
+    df = help.read_csv_typed(str(path), categorical=False)
+    assert df['sample_invalid_1'].tolist() == ['abc']
+    assert df['sample_invalid_2'].dtype == 'float64'
+    schema = help.get_csv_schema(df, categorical=False)
+    assert 'sample_invalid_1' not in schema
+
+
+def test_read_csv_typed_text_columns(tmpdir):
+    path = tmpdir.join('mq_typed.txt')
+    path.write('Component Name\tSample Name\tArea\n'
+               'Succinate 117/99\tsample 1\t5187\n')
+    df = help.read_csv_typed(str(path), sep='\t')
+    assert df['Sample Name'].tolist() == ['sample 1']
+    assert df['Area'].dtype == 'float64'
+    schema = help.get_csv_schema(df)
+    assert schema == {'Area': np.float64}
+    schema['Area'] = object
+    assert help.get_csv_schema(df) == {'Area': np.float64}
+
+
+def test_read_csv_typed_text_after_sample(tmpdir, monkeypatch):
+    monkeypatch.setattr(help, 'CSV_SCHEMA_SAMPLE_ROWS', 1)
+    path = tmpdir.join('maven_late_text.csv')
+    path.write('Name,Label,Formula,sample_late_1,sample_late_2\n'
+               'Acetic,C12 PARENT,C2H4O2,1,2\n'
+               'Acetic,C13-label-1,C2H4O2,abc,3\n')
+    df = help.read_csv_typed(str(path), categorical=False)
+    assert df['sample_late_1'].tolist() == ['1', 'abc']
+    assert df['sample_late_2'].dtype == 'float64'
+    assert 'sample_late_1' not in help.get_csv_schema(df.head(1), categorical=False)
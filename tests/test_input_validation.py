@@ -27,7 +27,7 @@ def test_read_input_file():
     with pytest.raises(custom_exception.FileExtensionError) as e:
         dataframe_validator.read_input_file(other_extension_file_path)
 
-    assert e.value.message == 'Only CSV , TXT , XLS ,XLSX file extension are allowed.'
+    assert e.value.message == 'Only CSV , TXT , XLS ,XLSX , PARQUET , FEATHER file extension are allowed.'
 
 def test_data_frame_empty():
     data_frame=pd.DataFrame()
@@ -93,6 +93,29 @@ def test_check_duplicate():
     print input_validation.check_duplicate(maven_df_correct,0,[['Name','Label']]).empty
 
 
+def test_check_duplicate_of():
+    input_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Lactic', 'Acetic', None, None],
+                             'Label': ['C12 PARENT', 'C13-label-1', 'C12 PARENT',
+                                       'C12 PARENT', 'C12 PARENT', 'C12 PARENT']},
+                            index=[10, 11, 12, 13, 14, 15])
+    result_df = input_validation.check_duplicate(input_df, 0, [['Name', 'Label']])
+    assert result_df['row_number'].tolist() == [13, 15]
+    assert result_df['duplicate_of'].tolist() == [10, 14]
+    assert result_df['column_name'].tolist() == ['Name-Label', 'Name-Label']
+    assert result_df['state'].tolist() == [constant.DUPLICATE_STATE] * 2
+
+
+def test_check_duplicate_hash_collision(monkeypatch):
+    input_df = pd.DataFrame({'Name': ['Acetic', 'Lactic', 'Acetic', None, None],
+                             'Label': ['C12 PARENT'] * 5})
+    monkeypatch.setattr(input_validation, 'hash_pandas_object',
+                        lambda df, index: pd.Series(0, index=df.index, dtype='uint64'))
+    duplicate_positions, first_positions = input_validation.get_duplicate_rows(
+        input_df, ['Name', 'Label'])
+    assert duplicate_positions.tolist() == [2, 4]
+    assert first_positions.tolist() == [0, 3]
+
+
 def test_check_missing():
     dir_path = os.path.dirname(os.path.abspath(__file__))
     maven_missing_entry_raw_file = os.path.join(dir_path, "test_input_validation_data",
@@ -123,6 +146,18 @@ def test_validator_column_wise():
     assert result_df.iloc[1]['state'] == 'invalid_intensity_value'
 
 
+def test_get_intensity_report():
+    maven_df = pd.DataFrame({'Sample1': [0.16, -0.15, None], 'Sample2': [-0.18, 'asa', '0.2']},
+                            index=[4, 5, 6])
+    result_df = input_validation.get_intensity_report(maven_df, ['Sample1', 'Sample2'])
+    assert result_df.columns.tolist() == ['state', 'column_name', 'row_number']
+    assert result_df['row_number'].tolist() == [5, 4, 5]
+    assert result_df['column_name'].tolist() == ['Sample1', 'Sample2', 'Sample2']
+    assert result_df['state'].tolist() == [constant.INTENSITY_STATE_NEGATIVE,
+                                           constant.INTENSITY_STATE_NEGATIVE,
+                                           constant.INTENSITY_STATE_INVALID]
+
+
 def test_get_isotope_name():
 
     assert input_validation.get_isotope_name(['C13','N15']) == ['C','N']
@@ -140,3 +175,20 @@ def test_get_split_isotopes():
     joined_isotopes = 'C13N15'
 
     assert input_validation.get_split_isotopes(joined_isotopes) == ['C13','N15']
+
+
+def test_get_validation_sample():
+    input_df = pd.DataFrame({'Sample1': range(20)})
+    sample_df = input_validation.get_validation_sample(input_df, 0.25)
+    assert len(sample_df) == 5
+    assert sample_df.index.is_monotonic_increasing
+    assert sample_df.equals(input_validation.get_validation_sample(input_df, 5))
+    assert input_validation.get_validation_sample(input_df, 50) is input_df
+
+
+def test_check_validation_mode():
+    input_validation.check_validation_mode('sampled')
+    with pytest.raises(ValueError):
+        input_validation.check_validation_mode('fast')
+    with pytest.raises(ValueError):
+        input_validation.check_validation_mode('sampled', 0)
@@ -148,3 +148,31 @@ def test_bulk_insert_data_to_fragment():
                                                                                                         "name='CDP')}"
 
 
+def test_get_label_counts_from_mass():
+    num_labels = iso.get_label_counts_from_mass(['C13', 'C13', 'C12'], [121.0, 123.0, 121.0],
+                                                ['C4H5O4', 'C4H5O4', 'C4H5O4'])
+    assert list(num_labels) == [4, 6, 0]
+
+
+def test_get_label_counts_from_mass_info():
+    parent_labels, daughter_labels = iso.get_label_counts_from_mass_info(
+        ['C13_117_99', 'C13_119_100'], ['C4H5O4', 'C4H5O4'], ['C4H3O3', 'C4H3O3'])
+    frag = Fragment('Succinate', 'C4H5O4', isotracer='C13', isotope_mass=119)
+    assert list(parent_labels) == [0, frag.label_dict['C13']]
+    assert list(daughter_labels) == [0, 1]
+
+
+def test_bulk_insert_data_to_fragment_mass():
+    frag_info = Multiquantkey('Succinate 117/99', 'C4H3O3', 'Succinate 117/99', 'C4H5O4')
+    list_data_dict = {'C13_117_99': {'sample 134': 5187.60},
+                      'C13_118_100': {'sample 134': 123.4}}
+    label_counts = iso.resolve_mass_labels((frag_info, label) for label in list_data_dict)
+    assert label_counts[('C4H5O4', 'C4H3O3', 'C13_117_99')] == (0, 0)
+    bulk_dict = iso.bulk_insert_data_to_fragment(frag_info, list_data_dict, mass=True,
+                                                 label_counts=label_counts)
+    for label, sample_dict in list_data_dict.iteritems():
+        single_dict = iso.insert_data_to_fragment_mass(frag_info, label, sample_dict)
+        key, value = single_dict.items()[0]
+        assert [frag.label_dict for frag in bulk_dict[key].frag] == \
+               [frag.label_dict for frag in value.frag]
+        assert bulk_dict[key].unlabeled == value.unlabeled
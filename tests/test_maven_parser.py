@@ -5,6 +5,7 @@ import pandas as pd
 from pandas.util.testing import assert_frame_equal
 
 from corna import custom_exception
+from corna import helpers
 from corna.inputs import maven_parser
 import constants
 from fixtures import *
@@ -178,3 +179,87 @@ def test_get_extracted_element():
 def test_get_element_list():
     input_df = read_csv(constants.MAVEN_FILE)
     assert maven_parser.get_element_list(input_df) == ['C', 'H', 'O', 'N']
+
+
+def test_group_chunks_by_metabolite():
+    maven_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Lactic', 'Lactic', 'Lactic', 'Citrate'],
+                             'Label': ['C12 PARENT', 'C13-label-1', 'C12 PARENT', 'C13-label-1',
+                                       'C13-label-2', 'C12 PARENT'],
+                             'Formula': ['C2H4O2', 'C2H4O2', 'C3H6O3', 'C3H6O3', 'C3H6O3', 'C6H8O7'],
+                             'sample_1': [1, 2, 3, 4, 5, 6]})
+    chunks = [maven_df.iloc[0:3], maven_df.iloc[3:4], maven_df.iloc[4:6]]
+    groups = list(maven_parser.group_chunks_by_metabolite(chunks))
+    assert [group['Name'].unique().tolist() for group in groups] == [['Acetic'], ['Lactic'], ['Citrate']]
+    assert pd.concat(groups).equals(maven_df)
+
+
+def test_group_chunks_by_metabolite_not_contiguous():
+    maven_df = pd.DataFrame({'Name': ['Acetic', 'Lactic', 'Acetic'],
+                             'Label': ['C12 PARENT', 'C12 PARENT', 'C13-label-1'],
+                             'Formula': ['C2H4O2', 'C3H6O3', 'C2H4O2'],
+                             'sample_1': [1, 2, 3]})
+    with pytest.raises(ValueError):
+        list(maven_parser.group_chunks_by_metabolite([maven_df.iloc[:2], maven_df.iloc[2:]]))
+
+
+def test_get_corrected_maven_df_validation_mode():
+    maven_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Lactic', 'Lactic'],
+                             'Label': ['C12 PARENT', 'C13-label-1', 'C12 PARENT', 'C13-label-1'],
+                             'Formula': ['C2H4O2', 'C2H4O2', 'C3H6O3', 'C3H6O3'],
+                             'sample_1': [1.0, 2.0, 3.0, 4.0],
+                             'sample_2': [float('nan')] * 4})
+    full_df, full_logs = maven_parser.get_corrected_maven_df(maven_df.copy())
+    sampled_df, sampled_logs = maven_parser.get_corrected_maven_df(maven_df.copy(), 'sampled', 1)
+    assert full_logs['warnings']['message']
+    assert sampled_logs == full_logs
+    assert_frame_equal(sampled_df, full_df)
+    schema_df, schema_logs = maven_parser.get_corrected_maven_df(maven_df.copy(), 'schema')
+    assert schema_logs == full_logs
+    assert_frame_equal(schema_df, full_df)
+    maven_df['sample_2'] = [5.0, 6.0, 7.0, 8.0]
+    schema_df, schema_logs = maven_parser.get_corrected_maven_df(maven_df.copy(), 'schema')
+    assert schema_logs == {'errors': [], 'warnings': {'action': [], 'message': []}}
+    assert_frame_equal(schema_df, maven_df)
+    with pytest.raises(ValueError):
+        maven_parser.get_corrected_maven_df(maven_df.copy(), 'sampled', 0)
+
+
+def test_read_maven_file_columnar_with_errors(tmpdir):
+    pytest.importorskip('pyarrow')
+    maven_df = pd.DataFrame({'Name': ['Acetic', 'Acetic'],
+                             'Label': ['C12 PARENT', 'C13-label-1'],
+                             'Formula': ['C2H4O2', 'C2H4O2'],
+                             'sample_1': [1.0, -2.0]})
+    path = str(tmpdir.join('maven.parquet'))
+    helpers.write_parquet(maven_df, path)
+    result_df, logs, isotracer_dict, element_list, summary = \
+        maven_parser.read_maven_file(path, None)
+    assert logs['errors']
+    assert isotracer_dict is None
+    with pytest.raises(custom_exception.MissingRequiredColumnError):
+        helpers.write_parquet(maven_df.drop('Formula', axis=1), path)
+        maven_parser.read_maven_file(path, None)
+
+
+def test_read_maven_file_workers(tmpdir, monkeypatch):
+    pytest.importorskip('pyarrow')
+    maven_df = pd.DataFrame({'Name': ['Acetic', 'Acetic'],
+                             'Label': ['C12 PARENT', 'C13-label-1'],
+                             'Formula': ['C2H4O2', 'C2H4O2'],
+                             'sample_1': [1.0, 2.0]},
+                            columns=['Name', 'Label', 'Formula', 'sample_1'])
+    path = str(tmpdir.join('maven.parquet'))
+    helpers.write_parquet(maven_df, path)
+    run_validation = maven_parser.ValidationReport.run_validation
+    workers_used = []
+
+    def record_workers(self, df, fn_lst, global_fn_lst=(), workers=None, **kwargs):
+        workers_used.append(workers)
+        return run_validation(self, df, fn_lst, global_fn_lst, workers, **kwargs)
+
+    monkeypatch.setattr(maven_parser.ValidationReport, 'run_validation', record_workers)
+    serial_result = maven_parser.read_maven_file(path, None)
+    parallel_result = maven_parser.read_maven_file(path, None, workers=2)
+    assert workers_used == [None, 2]
+    assert_frame_equal(parallel_result[0], serial_result[0])
+    assert parallel_result[1] == serial_result[1]
@@ -88,3 +88,28 @@ def test_filtered_raw_mq_df():
     sample_metadata = basic_validation.BasicValidator(MQ_SAMPLE_METADATA_PATH)
     with pytest.raises(Exception) as e:
         multiquant_parser.get_filtered_raw_mq_df(raw_mq, sample_metadata)
+
+
+def test_read_multiquant_dir(tmpdir):
+    mq_df = pd.read_table(MQ_FILE_PATH)
+    mq_df.iloc[:2].to_csv(str(tmpdir.join('mq_part1.txt')), sep='\t', index=False)
+    mq_df.iloc[2:].to_csv(str(tmpdir.join('mq_part2.txt')), sep='\t', index=False)
+    tmpdir.join('notes.pdf').write('')
+    result_df, logs, timings = multiquant_parser.read_multiquant_dir(str(tmpdir), workers=2,
+                                                                     validate=False)
+    assert timings.keys() == ['mq_part1.txt', 'mq_part2.txt']
+    assert logs.values() == [None, None]
+    assert_frame_equal(result_df, mq_df)
+    serial_df = multiquant_parser.read_multiquant_dir(str(tmpdir), validate=False)[0]
+    assert_frame_equal(serial_df, mq_df)
+
+
+def test_read_multiquant_dir_with_metadata(tmpdir):
+    mq_df = pd.read_table(MQ_FILE_PATH)
+    mq_df.to_csv(str(tmpdir.join('mq_export.txt')), sep='\t', index=False)
+    tmpdir.join('sample_metadata.xlsx').write('')
+    tmpdir.join('metadata.parquet').write('')
+    assert multiquant_parser.get_mq_file_list(str(tmpdir)) == [str(tmpdir.join('mq_export.txt'))]
+    result_df, logs, timings = multiquant_parser.read_multiquant_dir(str(tmpdir), validate=False)
+    assert timings.keys() == ['mq_export.txt']
+    assert_frame_equal(result_df, mq_df)
@@ -1,4 +1,7 @@
 import numpy.testing as npt
+import pandas as pd
+import pytest
+
 import corna.output as out
 from data_constants import output_constants
 
@@ -7,3 +10,33 @@ def test_convert_to_df():
 	out_df =  out.convert_dict_df(nest_dict)
 	out_df = out_df[['Formula', 'Intensity', 'Label', 'Name', 'Sample']]
 	npt.assert_array_equal(out_df, df)
+
+
+def test_result_writer_csv(tmpdir):
+	path = str(tmpdir.join('output.csv'))
+	first_df = pd.DataFrame({'Name': ['Acetic'], 'Sample': ['s1'], 'Intensity': [0.5]})
+	second_df = pd.DataFrame({'Intensity': [0.25], 'Name': ['Lactic'], 'Sample': ['s1']})
+	with out.ResultWriter(path) as writer:
+		writer.write(first_df)
+		writer.write(second_df)
+	result_df = pd.read_csv(path)
+	assert result_df.columns.tolist() == first_df.columns.tolist()
+	assert result_df['Name'].tolist() == ['Acetic', 'Lactic']
+
+
+def test_result_writer_columns_mismatch(tmpdir):
+	writer = out.ResultWriter(str(tmpdir.join('output.csv')))
+	writer.write(pd.DataFrame({'Name': ['Acetic'], 'Intensity': [0.5]}))
+	with pytest.raises(ValueError):
+		writer.write(pd.DataFrame({'Name': ['Acetic'], 'Sample': ['s1']}))
+	writer.close()
+
+
+def test_convert_dict_df_multiple_fragments():
+	nest_dict = {out.OutKey(name='Citrate 191/111', formula='C4H3O3'): {'C13_191.0_111.0': {'s1': 1.0, 's2': 2.0}},
+				 out.OutKey(name='Citrate 191/67', formula='C3H3O2'): {'C13_191.0_67.0': {'s1': 3.0}}}
+	out_df = out.convert_dict_df(nest_dict)
+	assert out_df.columns.tolist() == ['Label', 'Sample', 'Intensity', 'Name', 'Formula']
+	assert len(out_df) == 3
+	assert sorted(out_df['Name'].unique()) == ['Citrate 191/111', 'Citrate 191/67']
+	assert out_df['Intensity'].sum() == 6.0
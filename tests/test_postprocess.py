@@ -1,8 +1,12 @@
 import pickle
 
+import warnings
+
 import pytest
 import numpy as np
+import pandas as pd
 import corna.postprocess as postprocess
+from corna.isotopomer import Infopacket
 
 import constants
 
@@ -19,8 +23,55 @@ def test_sum_intensities_non_uniform_sample():
 	postprocess.sum_intensities(fragments_dict)
 
 
+def get_fragments_dict():
+	return {'Acetic_0': Infopacket('C2H4O2', {'s1': 3.0, 's2': 0.0, 's3': -1.0}, True, 'Acetic'),
+			'Acetic_1': Infopacket('C2H4O2', {'s1': 1.0, 's2': 0.0}, False, 'Acetic')}
+
+
+def test_replace_negative_to_zero():
+	post_proc_dict = postprocess.replace_negative_to_zero(get_fragments_dict())
+	assert post_proc_dict['Acetic_0'].data == {'s1': 3.0, 's2': 0.0, 's3': 0.0}
+	assert post_proc_dict['Acetic_1'].data == {'s1': 1.0, 's2': 0.0}
+	assert post_proc_dict['Acetic_1'].name == 'Acetic'
+
+
+def test_fractional_enrichment_zero_sum_warned_once():
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter('always')
+		frac_dict = postprocess.fractional_enrichment({'Acetic': get_fragments_dict()}, 2)
+	assert frac_dict['Acetic']['Acetic_0'].data == {'s1': 0.75, 's2': 0, 's3': 1.0}
+	assert frac_dict['Acetic']['Acetic_1'].data == {'s1': 0.25, 's2': 0}
+	assert len(caught) == 1
+	assert 's2 of Acetic' in str(caught[0].message)
+
 
+def test_get_pool_total():
+	na_corr_df = pd.DataFrame({'Name': ['Acetic', 'Acetic', 'Acetic', 'Lactic'],
+							   'Sample': ['s1', 's1', 's2', 's1'],
+							   'NA corrected': [2.0, -1.0, np.nan, 3.0]}, index=[0, 1, 0, 0])
+	pool_totals = postprocess.get_pool_total(na_corr_df, 'NA corrected', ['Name', 'Sample'])
+	assert pool_totals.tolist() == [2.0, 2.0, 0.0, 3.0]
+	grouped = postprocess.pool_total(na_corr_df, 'NA corrected')
+	assert grouped['Acetic']['s1'] == 2.0
+	assert grouped.index.names == ['Name', 'Sample']
 
 
+def test_sum_intensities_array_values():
+	fragments_dict = {'Acetic_0': Infopacket('C2H4O2', {'s1': np.array([0.0164]),
+														's2': np.array([-1.0])}, True, 'Acetic'),
+					  'Acetic_1': Infopacket('C2H4O2', {'s1': np.array([0.5])}, False, 'Acetic')}
+	assert postprocess.sum_intensities(fragments_dict) == {'s1': 0.5164, 's2': -1.0}
+	post_proc_dict = postprocess.replace_negative_to_zero(fragments_dict)
+	assert post_proc_dict['Acetic_0'].data == {'s1': np.array([0.0164]), 's2': np.array([0.0])}
+	assert all(isinstance(value, np.ndarray) and value.shape == (1,)
+			   for value in post_proc_dict['Acetic_0'].data.values())
 
 
+def test_replace_negative_to_zero_int():
+	fragments_dict = {'Acetic_0': Infopacket('C2H4O2', {'s1': 3, 's2': -1}, True, 'Acetic'),
+					  'Acetic_1': Infopacket('C2H4O2', {'s1': 1, 's2': 2}, False, 'Acetic')}
+	post_proc_dict = postprocess.replace_negative_to_zero(fragments_dict)
+	assert post_proc_dict['Acetic_0'].data == {'s1': 3, 's2': 0}
+	assert all(isinstance(value, int) for value in post_proc_dict['Acetic_0'].data.values())
+	frac_dict = postprocess.fractional_enrichment({'Acetic': post_proc_dict}, 2)
+	assert frac_dict['Acetic']['Acetic_0'].data == {'s1': 0.75, 's2': 0.0}
@@ -3,6 +3,7 @@ import pandas as pd
 import pytest
 
 import constants
+from corna import input_validation
 from corna.validation_report_class import ValidationReport
 
 
@@ -89,3 +90,38 @@ class TestValidationReport():
 
         with pytest.raises(TypeError) as e_info:
             self.validation.append_df_to_global_df(df)
+
+
+def test_take_action_fill_and_drop():
+    df = pd.DataFrame({'Name': ['A', None, 'C'], 'Label': ['l1', 'l2', 'l3'],
+                       'Formula': ['C2', 'C2', 'C2'], 'sample_1': [1.0, None, None]}, index=[3, 4, 5])
+    report_df = pd.DataFrame({'state': ['missing', 'missing', 'missing'],
+                              'column_name': ['Name', 'sample_1', 'sample_1'],
+                              'row_number': [4, 4, 5]})
+    validation = ValidationReport()
+    validation.append_df_to_global_df(report_df)
+    validation.generate_report()
+    validation.generate_action()
+    validation.decide_action()
+    new_df = validation.take_action(df)
+    assert new_df.index.tolist() == [3, 5]
+    assert new_df['sample_1'].tolist() == [1.0, 0]
+    assert validation.action_messages == ['Row is Dropped',
+                                          'Missing value of columns replaced with 0']
+
+
+def report_duplicate_names(df):
+    return input_validation.check_duplicate(df, 0, [['Name']])
+
+
+def test_run_validation_partitions():
+    df = pd.DataFrame({'Name': ['A', 'B', 'A', None, 'C', 'B', 'D'],
+                       'sample_1': [1.0, None, 2.0, 3.0, None, 4.0, 5.0]}, index=range(10, 17))
+    fn_lst = [input_validation.check_missing, report_duplicate_names]
+    validation = ValidationReport()
+    validation.run_validation(df, fn_lst, [report_duplicate_names], workers=2, chunksize=3)
+    report_df = validation.report_df
+    assert sorted(zip(report_df['row_number'], report_df['column_name'], report_df['state'])) == [
+        (11, 'sample_1', 'missing'), (12, 'Name', 'duplicate'), (13, 'Name', 'missing'),
+        (14, 'sample_1', 'missing'), (15, 'Name', 'duplicate')]
+    assert report_df['state'].tolist()[-2:] == ['duplicate', 'duplicate']